@@ -1,16 +1,87 @@
+import atexit
+import json
 import os
-from flask import Flask, render_template, Response, request, redirect, url_for, flash
+from flask import Flask, render_template, Response, request, redirect, url_for, flash, abort, session
 from flask_cors import CORS
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required
+from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 
 # Make sure this filename matches your automation script.
-from feedback_automator import run_feedback_automation
+from feedback_automator import CONFIG, create_browser_pool, create_chrome_reaper, create_shared_browser
+from engines import ENGINES, run_automation
+from batch import read_accounts, run_batch
+import metrics
+import portal_health
+import session_cache
+from jobs import JobManager, QueueFull
+from shared_jobs import AccountBusy, SharedJobs
+from progress_events import render_text, to_ndjson
+from run_timings import run_timings
 
 # Initialize the Flask app and tell it where to find HTML files.
 app = Flask(__name__, template_folder='.')
 app.config['SECRET_KEY'] = 'a-very-secret-key-that-should-be-changed'
 CORS(app)
 
+# --- Browser Pool Setup ---
+# Each gunicorn worker either keeps its own warm Chrome sessions so runs skip the cold start,
+# or one shared Chrome that hosts every run in a separate browser context.
+if CONFIG['BROWSER_CONTEXTS']:
+    browser_pool = create_shared_browser()
+elif CONFIG['BROWSER_POOL']['ENABLED']:
+    browser_pool = create_browser_pool()
+else:
+    browser_pool = None
+if browser_pool is not None:
+    atexit.register(browser_pool.close)
+
+# --- Orphan Cleanup ---
+# Kills browsers and deletes profiles left behind by crashed or killed workers.
+if CONFIG['CHROME_REAPER']['ENABLED']:
+    chrome_reaper = create_chrome_reaper(on_reap=metrics.record_reap)
+    atexit.register(chrome_reaper.close)
+
+# --- Background Jobs ---
+# Runs execute on a bounded pool of threads, so web workers and browser concurrency are sized separately.
+def _publish_metrics(job):
+    """Updates this worker's gauges, and records the run once it has ended."""
+    counts = job_manager.counts()
+    gauges = {'griet_runs_in_flight': counts['running'], 'griet_runs_queued': counts['queued'],
+              'griet_runs_queue_capacity': job_manager.max_queued}
+    if browser_pool is not None:
+        stats = browser_pool.stats()
+        if 'leased' in stats:
+            gauges['griet_browser_pool_leased'] = stats['leased']
+            gauges['griet_browser_pool_capacity'] = stats['max_size']
+        else:
+            gauges['griet_browser_pool_leased'] = stats['active_contexts']
+            gauges['griet_browser_pool_capacity'] = job_manager.max_workers
+    metrics.set_gauges(gauges)
+    if job.done:
+        metrics.record_run(job)
+
+job_manager = JobManager(
+    lambda username, password, engine: run_automation(username, password, engine=engine, pool=browser_pool),
+    max_workers=CONFIG['JOBS']['MAX_WORKERS'],
+    log_size=CONFIG['JOBS']['LOG_BUFFER_SIZE'],
+    on_change=_publish_metrics,
+    disconnect_grace=CONFIG['JOBS']['DISCONNECT_GRACE'],
+    max_queued=CONFIG['JOBS']['MAX_QUEUED'],
+    shared=SharedJobs(log_size=CONFIG['JOBS']['LOG_BUFFER_SIZE']) if CONFIG['JOBS']['SINGLE_FLIGHT'] else None,
+)
+atexit.register(job_manager.shutdown)
+
+# Batches of accounts run as jobs of their own. The accounts, passwords included, travel in
+# the runner's "password" argument, so like a single run's password they never sit on the Job.
+# Each account then runs as a job of job_manager, under the same caps as a single run.
+batch_manager = JobManager(
+    lambda label, batch, engine: run_batch(batch['accounts'], batch['parallel'], engine,
+                                           jobs=job_manager, owner=batch['owner']),
+    max_workers=CONFIG['BATCH']['MAX_BATCHES'],
+    log_size=CONFIG['JOBS']['LOG_BUFFER_SIZE'],
+    disconnect_grace=0,
+)
+atexit.register(batch_manager.shutdown)
+
 # --- User Authentication Setup ---
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -48,7 +119,9 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
-    """Logs the user out."""
+    """Logs the user out and forgets the portal sessions saved for the GRIET accounts they ran."""
+    for griet_username in session.pop('griet_usernames', []):
+        session_cache.invalidate(griet_username)
     logout_user()
     return redirect(url_for('login'))
 
@@ -58,27 +131,227 @@ def index():
     """Serves the main automation dashboard page after login."""
     return render_template('index.html')
 
-@app.route('/run-automation', methods=['POST'])
-@login_required # This protects the API endpoint.
-def run_automation_endpoint():
-    """API endpoint that runs the Selenium script."""
-    data = request.get_json()
+def _read_run_request():
+    """Validates the JSON body of a run request. Returns (username, password, engine, error response)."""
+    data = request.get_json(silent=True) or {}
     griet_username = data.get('username')
     griet_password = data.get('password')
+    engine = data.get('engine') or CONFIG['ENGINE']
 
     if not griet_username or not griet_password:
-        return Response("Error: GRIET Username and Password are required.", status=400)
-
-    def generate_logs():
-        """A generator function that calls the automation script and yields its logs."""
-        try:
-            # Call the function from the other file and stream its output.
-            for message in run_feedback_automation(griet_username, griet_password):
-                yield message
-        except Exception as e:
-            yield f"\n--- A critical error occurred in the backend ---\nError details: {str(e)}"
-
-    return Response(generate_logs(), mimetype='text/plain')
+        return None, None, None, Response("Error: GRIET Username and Password are required.", status=400)
+    if engine not in ENGINES:
+        return None, None, None, Response(f"Error: Unknown engine '{engine}'. Choose one of: {', '.join(ENGINES)}.", status=400)
+    # Remembered so logging out can drop the portal sessions cached for these accounts. Only the
+    # last 20 are kept, as the list lives in the session cookie; an older account's saved
+    # session simply runs out its SESSION_CACHE_TTL.
+    if griet_username not in session.get('griet_usernames', []):
+        session['griet_usernames'] = session.get('griet_usernames', [])[-19:] + [griet_username]
+    return griet_username, griet_password, engine, None
+
+def _event_stream(events):
+    """Renders (event_id, event) pairs as NDJSON, or as plain log text with ?format=text."""
+    render = render_text if request.args.get('format') == 'text' else to_ndjson
+    mimetype = 'text/plain' if render is render_text else 'application/x-ndjson'
+    return Response((render(event) for _, event in events), mimetype=mimetype)
+
+def _submit_job(griet_username, griet_password, engine):
+    """Starts a run, or attaches to the one already in flight for this account. Returns (job, attached, error response)."""
+    try:
+        # While the breaker is open, refuse now rather than queue a run that would be refused anyway.
+        portal_health.check()
+    except portal_health.PortalUnavailable as e:
+        return None, False, Response(f"Error: {e}", status=503, headers={'Retry-After': str(e.retry_after)})
+    try:
+        job, attached = job_manager.submit(current_user.id, griet_username, griet_password, engine)
+    except AccountBusy as e:
+        return None, False, Response(f"Error: {e} Wait for it to finish or cancel it.", status=409)
+    except QueueFull as e:
+        metrics.count('griet_runs_rejected_total')
+        return None, False, Response(f"Error: {e}", status=429, headers={'Retry-After': str(e.retry_after)})
+    if attached and job.owner != current_user.id and job.id not in session.get('attached_jobs', []):
+        # Knowing the account's password is what entitles this user to follow someone else's run of it.
+        session['attached_jobs'] = session.get('attached_jobs', [])[-49:] + [job.id]
+    return job, attached, None
+
+def _owned_job(job_id):
+    """Returns the job if it exists and belongs to (or was attached to by) the logged-in user, otherwise aborts with 404."""
+    job = job_manager.get(job_id)
+    if job is None or (job.owner != current_user.id and job_id not in session.get('attached_jobs', [])):
+        abort(404)
+    return job
+
+@app.route('/run-automation', methods=['POST'])
+@login_required # This protects the API endpoint.
+def run_automation_endpoint():
+    """API endpoint that starts a run as a background job and streams its events as NDJSON."""
+    griet_username, griet_password, engine, error = _read_run_request()
+    if error:
+        return error
+
+    job, attached, error = _submit_job(griet_username, griet_password, engine)
+    if error:
+        return error
+    # If this connection drops and nobody follows the job again within the grace period, it is cancelled.
+    response = _event_stream(job.follow())
+    response.headers['X-Job-Id'] = job.id
+    response.headers['X-Job-Attached'] = '1' if attached else '0'
+    return response
+
+@app.route('/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    """Queues a run and returns its job ID immediately."""
+    griet_username, griet_password, engine, error = _read_run_request()
+    if error:
+        return error
+
+    job, attached, error = _submit_job(griet_username, griet_password, engine)
+    if error:
+        return error
+    return {'job_id': job.id, 'status': job.status, 'attached': attached}, 202
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Reports the status of a job."""
+    return _owned_job(job_id).to_dict()
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+@login_required
+def cancel_job(job_id):
+    """Cancels a job. A running job stops after its current step and releases its browser."""
+    job = _owned_job(job_id)
+    if not job.done:
+        job.cancel("request", "\n⛔ Run cancelled on request.")
+    return {'job_id': job.id, 'status': job.status}, 202
+
+@app.route('/jobs/<job_id>/log')
+@login_required
+def job_log(job_id):
+    """Streams a job's events after the given event ID (default 0) until the job ends."""
+    job = _owned_job(job_id)
+    after = request.args.get('after', 0, type=int)
+    return _event_stream(job.follow(after))
+
+@app.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job's progress events. A client that reconnects with
+    Last-Event-ID only gets the events it missed. The stream ends with an 'end' event
+    carrying the result.
+    """
+    job = _owned_job(job_id)
+    after = request.headers.get('Last-Event-ID', type=int) or request.args.get('lastEventId', 0, type=int)
+
+    def generate_events():
+        yield "retry: 2000\n\n"
+        for event in job.follow(after, heartbeat=15):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id, progress_event = event
+            yield f"id: {event_id}\ndata: {json.dumps(progress_event)}\n\n"
+        yield f"event: end\ndata: {json.dumps({'status': job.status, 'result': job.result})}\n\n"
+
+    return Response(generate_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/result')
+@login_required
+def job_result(job_id):
+    """Returns the final result of a job, or 202 while it is still running."""
+    job = _owned_job(job_id)
+    if not job.done:
+        return {'job_id': job.id, 'status': job.status}, 202
+    return {'job_id': job.id, 'status': job.status, 'result': job.result, 'log': job.log_text()}
+
+def _owned_batch(batch_id):
+    """Returns the batch if it exists and belongs to the logged-in user, otherwise aborts with 404."""
+    batch = batch_manager.get(batch_id)
+    if batch is None or batch.owner != current_user.id:
+        abort(404)
+    return batch
+
+def _batch_dict(batch):
+    info = batch.to_dict()
+    info['batch_id'] = info.pop('job_id')
+    final = batch.outcome_event
+    if final is not None:
+        info['accounts'] = final.get('accounts', [])
+        info['accounts_per_minute'] = final.get('accounts_per_minute')
+    return info
+
+@app.route('/batches', methods=['POST'])
+@login_required
+def submit_batch():
+    """
+    Queues a batch from an uploaded CSV or JSONL file of accounts (form field 'file', or the raw
+    request body). ?parallel= sets how many accounts run at once and ?engine= the default engine.
+    """
+    upload = request.files.get('file')
+    raw = upload.read() if upload else request.get_data()
+    try:
+        accounts = read_accounts(raw.decode('utf-8-sig'))
+    except (UnicodeDecodeError, ValueError) as e:
+        return Response(f"Error: {e}", status=400)
+    if len(accounts) > CONFIG['BATCH']['MAX_ACCOUNTS']:
+        return Response(f"Error: A batch may have at most {CONFIG['BATCH']['MAX_ACCOUNTS']} accounts.", status=400)
+    engine = request.values.get('engine') or CONFIG['ENGINE']
+    if engine not in ENGINES:
+        return Response(f"Error: Unknown engine '{engine}'. Choose one of: {', '.join(ENGINES)}.", status=400)
+    parallel = min(max(request.values.get('parallel', CONFIG['BATCH']['MAX_PARALLEL'], type=int), 1),
+                   CONFIG['BATCH']['MAX_PARALLEL'])
+
+    batch, _ = batch_manager.submit(current_user.id, f"{len(accounts)} accounts",
+                                    {'accounts': accounts, 'parallel': parallel, 'owner': current_user.id}, engine)
+    return {'batch_id': batch.id, 'status': batch.status, 'accounts': len(accounts), 'parallel': parallel}, 202
+
+@app.route('/batches/<batch_id>')
+@login_required
+def batch_status(batch_id):
+    """Reports the status of a batch and, once it has ended, the outcome of every account and the throughput."""
+    return _batch_dict(_owned_batch(batch_id))
+
+@app.route('/batches/<batch_id>', methods=['DELETE'])
+@login_required
+def cancel_batch(batch_id):
+    """Cancels a batch. Runs in flight stop after their current step; accounts not started yet are skipped."""
+    batch = _owned_batch(batch_id)
+    if not batch.done:
+        batch.cancel("request", "\n⛔ Batch cancelled on request.")
+    return {'batch_id': batch.id, 'status': batch.status}, 202
+
+@app.route('/batches/<batch_id>/log')
+@login_required
+def batch_log(batch_id):
+    """Streams a batch's progress, one event per account started and finished, after the given event ID."""
+    batch = _owned_batch(batch_id)
+    after = request.args.get('after', 0, type=int)
+    return _event_stream(batch.follow(after))
+
+@app.route('/pool-stats')
+@login_required
+def pool_stats():
+    """Reports browser pool occupancy and lease wait times, or shared browser memory use."""
+    if browser_pool is None:
+        return {'enabled': False}
+    return {'enabled': True, **browser_pool.stats()}
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint, aggregated over every gunicorn worker on this host. Deliberately
+    not behind the login, so a scraper can reach it; restrict it at the proxy instead.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/run-stats')
+@login_required
+def run_stats():
+    """Reports per-stage latency percentiles and WebDriver command counts of recent runs in this worker."""
+    return {**run_timings.stats(), 'recent': run_timings.recent()}
 
 if __name__ == '__main__':
     app.run(port=5000, debug=True)
@@ -0,0 +1,128 @@
+import os
+import tempfile
+
+# Settings shared by every automation engine. This module must not import Selenium, so the
+# HTTP engine and command-line tools can load it without paying for a browser stack.
+
+# --- Configuration ---
+CONFIG = {
+    # Override with GRIET_LOGIN_URL, e.g. to point at the local mock portal (see mock_portal.py).
+    "LOGIN_URL": os.environ.get("GRIET_LOGIN_URL", "http://webprosindia.com/Gokaraju/"),
+    "TERM_VALUE_TO_SELECT": "1",
+    "SUBMIT_FORM": False,
+    "SELECTORS": {
+        "username_field_id": "txtId2",
+        "password_field_id": "txtPwd2",
+        "login_button_id": "imgBtn2",
+        "feedback_link_text": "FEEDBACK",
+        "iframe_name": "capIframe",
+        "term_dropdown_id": "ctl00_CapPlaceHolder_ddlExams",
+        "question_rows_xpath": "//table[contains(@id, 'gvStudentFeedback')]//tr[.//input[@type='radio']]",
+        "submit_button_id": "ContentPlaceHolder1_btnSubmit"
+    },
+    # Rating for every question; add 1-based question numbers as keys to override single questions.
+    "RATINGS": { "default": 4 },
+    # Text the portal shows when it rejects a login (matched case-insensitively).
+    "LOGIN_ERROR_TEXTS": ["Invalid Username", "Invalid Password", "Invalid User", "incorrect", "does not exist"],
+    # Which engine runs the automation: "selenium" (real Chrome) or "http" (plain form posts, see http_engine.py).
+    "ENGINE": os.environ.get("AUTOMATION_ENGINE", "selenium"),
+    "HTTP_TIMEOUT": 25,
+    # Seconds the Selenium engine waits for a page element before the run ends with "timeout".
+    "PAGE_TIMEOUT": 25,
+    # After login, open the feedback page at its cached URL instead of clicking through the dashboard (see portal_links.py).
+    "DEEP_LINK": os.environ.get("DEEP_LINK", "1") == "1",
+    # Background job workers (see jobs.py): how many automation runs execute at once per web worker.
+    "JOBS": {
+        "MAX_WORKERS": int(os.environ.get("JOB_WORKERS", "2")),
+        # Runs that may wait for a job worker; more get 429 Too Many Requests with a Retry-After.
+        "MAX_QUEUED": int(os.environ.get("JOB_MAX_QUEUED", "10")),
+        # Progress events kept per job for replay to reconnecting clients (see Job in jobs.py for the overflow policy).
+        "LOG_BUFFER_SIZE": int(os.environ.get("JOB_LOG_BUFFER", "1000")),
+        # Seconds a followed job may go without any client before it is cancelled; 0 keeps it running.
+        "DISCONNECT_GRACE": float(os.environ.get("JOB_DISCONNECT_GRACE", "10")),
+        # Share jobs across gunicorn workers and run at most one job per GRIET account (see shared_jobs.py).
+        "SINGLE_FLIGHT": os.environ.get("JOB_SINGLE_FLIGHT", "1") == "1"
+    },
+    # Batch runs over a file of accounts (see batch.py).
+    "BATCH": {
+        # Accounts a batch runs at once, and the most a request to POST /batches may ask for.
+        "MAX_PARALLEL": int(os.environ.get("BATCH_MAX_PARALLEL", "4")),
+        "MAX_ACCOUNTS": int(os.environ.get("BATCH_MAX_ACCOUNTS", "500")),
+        # Batches a web worker runs at the same time; further ones wait for their turn.
+        "MAX_BATCHES": int(os.environ.get("BATCH_MAX_BATCHES", "1"))
+    },
+    # Warm pool of headless Chrome sessions (see browser_pool.py). Disabled unless BROWSER_POOL=1.
+    "BROWSER_POOL": {
+        "ENABLED": os.environ.get("BROWSER_POOL", "0") == "1",
+        "MIN_SIZE": int(os.environ.get("BROWSER_POOL_MIN", "1")),
+        "MAX_SIZE": int(os.environ.get("BROWSER_POOL_MAX", "4")),
+        "MAX_RUNS_PER_SESSION": int(os.environ.get("BROWSER_POOL_MAX_RUNS", "20")),
+        "MAX_MEMORY_MB": int(os.environ.get("BROWSER_POOL_MAX_MEMORY_MB", "700")),
+        "LEASE_TIMEOUT": int(os.environ.get("BROWSER_POOL_LEASE_TIMEOUT", "60"))
+    },
+    # One shared Chrome with an isolated browser context per run (see browser_contexts.py).
+    "BROWSER_CONTEXTS": os.environ.get("BROWSER_CONTEXTS", "0") == "1",
+    # Requests the automation never needs (see resource_blocking.py). Disable with RESOURCE_BLOCKING=0.
+    "RESOURCE_BLOCKING": {
+        "ENABLED": os.environ.get("RESOURCE_BLOCKING", "1") == "1",
+        "BLOCK_TYPES": ["image", "font", "stylesheet", "media"],
+        "BLOCK_PATTERNS": [
+            "*google-analytics.com/*",
+            "*googletagmanager.com/*",
+            "*doubleclick.net/*",
+            "*facebook.net/*",
+        ],
+        # URLs let through despite the deny rules. An exact URL is cheapest: only the deny
+        # patterns matching it are checked per request, the rest stay inside Chrome. A pattern
+        # with wildcards has every deny rule checked per request.
+        "ALLOW_PATTERNS": [],
+        "BLOCK_THIRD_PARTY_SCRIPTS": True
+    },
+    # Background cleanup of Chrome processes and profile folders left behind by crashed runs (see chrome_reaper.py).
+    "CHROME_REAPER": {
+        "ENABLED": os.environ.get("CHROME_REAPER", "1") == "1",
+        "INTERVAL": int(os.environ.get("CHROME_REAPER_INTERVAL", "60")),
+        # Profile folders younger than this are never removed, in case their Chrome is still starting.
+        "MIN_PROFILE_AGE": int(os.environ.get("CHROME_REAPER_MIN_PROFILE_AGE", "60"))
+    },
+    # Host-wide limit on requests to the portal, adapted to how fast it answers (see portal_limiter.py).
+    "PORTAL_LIMITER": {
+        "ENABLED": os.environ.get("PORTAL_LIMITER", "1") == "1",
+        # Requests per second: the starting rate, and the range AIMD keeps it in.
+        "START_RATE": float(os.environ.get("PORTAL_RATE", "5")),
+        "MIN_RATE": float(os.environ.get("PORTAL_MIN_RATE", "0.5")),
+        "MAX_RATE": float(os.environ.get("PORTAL_MAX_RATE", "20")),
+        # Requests that may go out at once after a quiet spell.
+        "BURST": int(os.environ.get("PORTAL_BURST", "10")),
+        # Each quick success adds INCREASE requests per second; a failure or an answer slower
+        # than SLOW_RESPONSE seconds multiplies the rate by DECREASE_FACTOR.
+        "INCREASE": 0.1,
+        "DECREASE_FACTOR": 0.5,
+        "DECREASE_INTERVAL": 2,
+        "SLOW_RESPONSE": float(os.environ.get("PORTAL_SLOW_RESPONSE", "5")),
+        "MAX_CONCURRENT_LOGINS": int(os.environ.get("PORTAL_MAX_LOGINS", "4")),
+        # Seconds after which a login slot is freed even if its run never released it.
+        "LOGIN_LEASE": 60
+    },
+    # Circuit breaker that refuses runs while the portal is down (see portal_health.py).
+    "PORTAL_HEALTH": {
+        "ENABLED": os.environ.get("PORTAL_BREAKER", "1") == "1",
+        # The HEAD probe of the login page: how long its answer is reused, and how long it may take.
+        "PROBE_TTL": int(os.environ.get("PORTAL_PROBE_TTL", "10")),
+        "PROBE_TIMEOUT": float(os.environ.get("PORTAL_PROBE_TIMEOUT", "3")),
+        # Runs in a row ending in portal_error or timeout that open the breaker.
+        "FAILURE_THRESHOLD": int(os.environ.get("PORTAL_BREAKER_FAILURES", "3")),
+        # Seconds the breaker stays open before a trial run, and the longest a trial run may hold its place.
+        "OPEN_SECONDS": int(os.environ.get("PORTAL_BREAKER_OPEN_SECONDS", "30")),
+        "TRIAL_TIMEOUT": 120
+    },
+    # Encrypted cache of portal session cookies, so repeat runs skip the login form (see session_cache.py).
+    # Disabled unless SESSION_CACHE_KEY holds a Fernet key.
+    "SESSION_CACHE": {
+        "KEY": os.environ.get("SESSION_CACHE_KEY", ""),
+        "TTL": int(os.environ.get("SESSION_CACHE_TTL", "900"))
+    },
+    # SQLite file shared by every gunicorn worker on this host (see shared_store.py), e.g. for /metrics.
+    "SHARED_STORE_PATH": os.environ.get("SHARED_STORE_PATH", os.path.join(tempfile.gettempdir(), "griet-shared.sqlite3"))
+}
+
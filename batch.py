@@ -0,0 +1,211 @@
+"""
+Runs the feedback automation for many GRIET accounts, several at a time.
+
+Usage:
+    python batch.py accounts.csv [--parallel 4] [--engine http] [--format text|ndjson] [--results results.csv]
+
+The accounts file is a CSV with "username" and "password" columns (a header row is optional;
+without one the first two columns are used) or JSONL with one {"username", "password"} object
+per line. Either may add an "engine" column or key per account. "-" reads from stdin.
+The exit status is 0 when every account succeeded and 1 otherwise.
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+
+import progress_events
+from automator_config import CONFIG
+from engines import ENGINES, run_automation
+from jobs import JobManager, QueueFull
+from shared_jobs import AccountBusy
+
+
+def read_accounts(text):
+    """
+    Parses CSV or JSONL account data into [{"username", "password", "engine"}], dropping
+    repeated usernames. Raises ValueError naming the offending line.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if lines and lines[0].lstrip().startswith("{"):
+        rows = []
+        for number, line in enumerate(lines, 1):
+            try:
+                rows.append((number, json.loads(line)))
+            except ValueError as e:
+                raise ValueError(f"Line {number} is not valid JSON: {e}")
+    else:
+        reader = list(csv.reader(lines))
+        header = [column.strip().lower() for column in reader[0]] if reader else []
+        if "username" in header and "password" in header:
+            rows = [(number, dict(zip(header, row))) for number, row in enumerate(reader[1:], 2)]
+        else:
+            rows = [(number, dict(zip(("username", "password", "engine"), row))) for number, row in enumerate(reader, 1)]
+
+    accounts = {}
+    for number, row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f"Line {number} must be an object with a username and a password.")
+        username = str(row.get("username") or "").strip()
+        password = str(row.get("password") or "")
+        engine = str(row.get("engine") or "").strip() or None
+        if not username or not password:
+            raise ValueError(f"Line {number} needs both a username and a password.")
+        if engine is not None and engine not in ENGINES:
+            raise ValueError(f"Line {number}: unknown engine '{engine}'. Choose one of: {', '.join(ENGINES)}.")
+        accounts.setdefault(username, {"username": username, "password": password, "engine": engine})
+    if not accounts:
+        raise ValueError("No accounts found.")
+    return list(accounts.values())
+
+
+def run_batch(accounts, parallel=2, engine=None, jobs=None, owner="batch"):
+    """
+    Runs every account as a job of `jobs` (a JobManager), with at most `parallel` of them
+    submitted at once, and yields an account_start and an account_done event per account, then
+    an outcome event for the whole batch. Without `jobs`, a JobManager of `parallel` workers is
+    made for the batch. Closing the generator cancels the jobs it started, which stop after
+    their current step, and skips the accounts that have not started.
+
+    Going through the JobManager gives batch runs what single runs get: its worker cap, queue
+    admission, metrics and, with a shared store, one run per account at a time.
+    """
+    own_jobs = jobs is None
+    if own_jobs:
+        jobs = JobManager(lambda username, password, engine: run_automation(username, password, engine=engine),
+                          max_workers=max(1, parallel), disconnect_grace=0)
+    finished = queue.Queue()
+    stop = threading.Event()
+    started_at = time.monotonic()
+
+    def run_one(account):
+        if stop.is_set():
+            return
+        finished.put((account, progress_events.account_start(account["username"])))
+        try:
+            final = _run_as_job(jobs, owner, account, account["engine"] or engine, stop)
+        except Exception as e:
+            final = progress_events.outcome("error", f"A critical error occurred: {e}")
+        finished.put((account, final or progress_events.outcome("aborted", "The batch was cancelled.")))
+
+    # These threads only submit jobs and follow them; the runs themselves execute on the JobManager's workers.
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix="batch-follow")
+    try:
+        for account in accounts:
+            executor.submit(run_one, account)
+
+        results = []
+        while len(results) < len(accounts):
+            account, event = finished.get()
+            if event["type"] == "account_start":
+                yield event
+                continue
+            result = {
+                "outcome": event["outcome"],
+                "ok": event["ok"],
+                "duration": event.get("duration", 0.0),
+                "detail": event["message"].strip(),
+            }
+            results.append({"account": account["username"], **result})
+            yield progress_events.account_done(account["username"], result, **_progress(results, len(accounts), started_at))
+
+        progress = _progress(results, len(accounts), started_at)
+        code = "success" if progress["failed"] == 0 else "error"
+        message = (f"\nBatch finished: {progress['succeeded']}/{progress['total']} accounts succeeded in "
+                   f"{time.monotonic() - started_at:.0f} s ({progress['accounts_per_minute']:.1f} accounts/min).\n")
+        yield progress_events.outcome(code, message, duration=time.monotonic() - started_at, accounts=results,
+                                      succeeded=progress["succeeded"], failed=progress["failed"],
+                                      accounts_per_minute=progress["accounts_per_minute"])
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        if own_jobs:
+            jobs.shutdown()
+
+
+def _run_as_job(jobs, owner, account, engine, stop):
+    """
+    Submits one account to `jobs` and follows its job to the outcome event, which it returns.
+    While the queue is full it waits and submits again. If a run for the account is already in
+    flight it follows that one, and leaves it running when the batch stops.
+    Returns None if the batch stopped first.
+    """
+    while True:
+        try:
+            job, attached = jobs.submit(owner, account["username"], account["password"], engine)
+            break
+        except QueueFull as e:
+            if stop.wait(e.retry_after):
+                return None
+        except AccountBusy as e:
+            return progress_events.outcome("error", str(e))
+
+    final = None
+    for entry in job.follow(heartbeat=1):
+        if stop.is_set():
+            if not attached:
+                job.cancel("request", "\n⛔ Batch cancelled on request.")
+            return None
+        if entry is not None and entry[1]["type"] == "outcome":
+            final = entry[1]
+    if final is None and job.result is not None:
+        # A job of a worker that died ends without an outcome event of its own.
+        final = progress_events.outcome(job.result["outcome"], job.result["message"])
+    return final
+
+
+def _progress(results, total, started_at):
+    elapsed = time.monotonic() - started_at
+    succeeded = sum(result["ok"] for result in results)
+    return {
+        "done": len(results),
+        "total": total,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "accounts_per_minute": len(results) / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+
+
+def write_results(path, accounts):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["account", "outcome", "ok", "duration", "detail"])
+        writer.writeheader()
+        writer.writerows(accounts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accounts", help="CSV or JSONL file of accounts, or - for stdin")
+    parser.add_argument("--parallel", type=int, default=CONFIG["BATCH"]["MAX_PARALLEL"], help="accounts run at once")
+    parser.add_argument("--engine", choices=ENGINES, default=CONFIG["ENGINE"])
+    parser.add_argument("--format", choices=("text", "ndjson"), default="text", help="how progress is printed")
+    parser.add_argument("--results", help="also write one row per account to this CSV file")
+    args = parser.parse_args()
+
+    if args.accounts == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.accounts, encoding="utf-8-sig") as f:
+            text = f.read()
+    try:
+        accounts = read_accounts(text)
+    except ValueError as e:
+        parser.error(str(e))
+
+    render = progress_events.render_text if args.format == "text" else progress_events.to_ndjson
+    final = None
+    for event in run_batch(accounts, args.parallel, args.engine):
+        sys.stdout.write(render(event))
+        sys.stdout.flush()
+        final = event
+    if args.results:
+        write_results(args.results, final["accounts"])
+    sys.exit(0 if final["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmarks for the feedback automation.
+
+Usage:
+    python benchmark.py memory --runs 5 [--url http://webprosindia.com/Gokaraju/]
+    python benchmark.py fill [--rows 10 100 1000]
+    python benchmark.py waits [--runs 5] [--render-delay 0.3]
+    python benchmark.py concurrency [--runs 4]
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import os
+import threading
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select, WebDriverWait
+
+import feedback_automator
+import mock_portal
+import progress_events
+from chrome_procs import driver_service_pid, process_tree_rss
+from event_wait import EventWait
+from feedback_automator import CONFIG, create_driver, close_driver, create_shared_browser
+from page_ops import count_commands, fill_ratings
+
+MB = 1024 * 1024
+
+
+def bench_memory(runs, url):
+    """Compares memory per concurrent run: one Chrome per run vs. one context per run."""
+    drivers = []
+    try:
+        for _ in range(runs):
+            driver = create_driver()
+            drivers.append(driver)
+            driver.get(url)
+        process_total = sum(process_tree_rss(driver_service_pid(d)) for d in drivers)
+    finally:
+        for driver in drivers:
+            close_driver(driver)
+
+    shared = create_shared_browser()
+    try:
+        with contextlib.ExitStack() as stack:
+            for i in range(runs):
+                stack.enter_context(shared.lease(f"bench-{i}")).get(url)
+            context_total = shared.stats()["memory_bytes"]
+    finally:
+        shared.close()
+
+    print(f"Concurrent runs:        {runs}")
+    print(f"Process per run:        {process_total / MB:8.1f} MB total, {process_total / runs / MB:6.1f} MB/run")
+    print(f"Context per run:        {context_total / MB:8.1f} MB total, {context_total / runs / MB:6.1f} MB/run")
+    print(f"Saved per run:          {(process_total - context_total) / runs / MB:8.1f} MB")
+
+
+def _open_mock_form(driver, login_url):
+    """Logs in to the mock portal and opens the feedback form with a term selected."""
+    selectors = CONFIG["SELECTORS"]
+    driver.get(login_url)
+    driver.find_element(By.ID, selectors["username_field_id"]).send_keys("bench")
+    driver.find_element(By.ID, selectors["password_field_id"]).send_keys("bench")
+    driver.find_element(By.ID, selectors["login_button_id"]).click()
+    driver.get(login_url + "Academics/StudentFeedback.aspx")
+    Select(driver.find_element(By.ID, selectors["term_dropdown_id"])).select_by_value("1")
+    driver.find_element(By.XPATH, selectors["question_rows_xpath"])
+
+
+def _fill_per_row(driver, rows_xpath, rating):
+    """The original fill loop: one find_element and one execute_script per question."""
+    for row in driver.find_elements(By.XPATH, rows_xpath):
+        radio_button = row.find_element(By.XPATH, f".//input[@type='radio' and @value='{rating}']")
+        driver.execute_script("arguments[0].click();", radio_button)
+
+
+def bench_fill(row_counts):
+    """Times the fill stage on the mock form, per-row round trips vs. one batched script."""
+    rows_xpath = CONFIG["SELECTORS"]["question_rows_xpath"]
+    rating = CONFIG["RATINGS"]["default"]
+    driver = create_driver()
+    try:
+        print(f"{'rows':>6} | {'per-row cmds':>12} {'per-row s':>10} {'(+sleeps s)':>11} | {'batched cmds':>12} {'batched s':>10}")
+        for rows in row_counts:
+            server, login_url = mock_portal.start_background(mock_portal.create_app(questions=rows))
+            try:
+                _open_mock_form(driver, login_url)
+                with count_commands(driver) as per_row:
+                    started = time.perf_counter()
+                    _fill_per_row(driver, rows_xpath, rating)
+                    per_row_seconds = time.perf_counter() - started
+
+                _open_mock_form(driver, login_url)
+                with count_commands(driver) as batched:
+                    started = time.perf_counter()
+                    results = fill_ratings(driver, rows_xpath, rating)
+                    batched_seconds = time.perf_counter() - started
+                assert len(results) == rows and all(r["answered"] for r in results)
+            finally:
+                server.shutdown()
+            print(f"{rows:>6} | {per_row['commands']:>12} {per_row_seconds:>10.3f} {rows * 0.05:>11.2f} | "
+                  f"{batched['commands']:>12} {batched_seconds:>10.3f}")
+    finally:
+        close_driver(driver)
+
+
+def _timed(wait_class, spent):
+    """A subclass of `wait_class` that adds the time spent in every wait to spent[0]."""
+    class TimedWait(wait_class):
+        def until(self, method, message=""):
+            started = time.perf_counter()
+            try:
+                return super().until(method, message)
+            finally:
+                spent[0] += time.perf_counter() - started
+
+    return TimedWait
+
+
+def bench_waits(runs, render_delay):
+    """
+    Runs the Selenium steps against the mock portal with polling waits and with event-driven
+    waits. The portal renders each awaited element `render_delay` seconds after load, so the
+    difference in time spent waiting is the dead time the 0.5 s polling adds per run.
+    """
+    server, login_url = mock_portal.start_background(mock_portal.create_app(questions=20, render_delay=render_delay))
+    CONFIG["LOGIN_URL"] = login_url
+    # Every run must take the same path: after the first, a deep link would skip the FEEDBACK page and its waits.
+    deep_link = CONFIG["DEEP_LINK"]
+    CONFIG["DEEP_LINK"] = False
+    results = {}
+    try:
+        for label, wait_class in (("polling (WebDriverWait)", WebDriverWait), ("event-driven (EventWait)", EventWait)):
+            waited, totals = [], []
+            for _ in range(runs):
+                spent = [0.0]
+                feedback_automator.EventWait = _timed(wait_class, spent)
+                with feedback_automator.launch_chrome() as driver:
+                    started = time.perf_counter()
+                    steps = feedback_automator._automation_steps(driver, "bench", "bench", progress_events.RunTracker())
+                    for _ in steps:
+                        pass
+                    totals.append(time.perf_counter() - started)
+                waited.append(spent[0])
+            results[label] = (sum(waited) / runs, sum(totals) / runs)
+    finally:
+        feedback_automator.EventWait = EventWait
+        CONFIG["DEEP_LINK"] = deep_link
+        server.shutdown()
+
+    print(f"Runs per mode: {runs}, render delay: {render_delay:.2f} s per awaited element")
+    for label, (waited, total) in results.items():
+        print(f"{label:<26} waits {waited:6.3f} s/run   whole run {total:6.3f} s/run")
+    (poll_wait, _), (event_wait, _) = results.values()
+    print(f"Wait overhead removed:     {poll_wait - event_wait:6.3f} s/run")
+
+
+def bench_concurrency(runs):
+    """
+    Starts `runs` Chrome sessions with launch_chrome() at once and drives each through the mock
+    portal to the filled form. Checks that every session had its own profile folder and
+    debugging port, that every run succeeded, and that no profile folder outlived its run.
+    """
+    server, login_url = mock_portal.start_background(mock_portal.create_app(questions=10))
+    CONFIG["LOGIN_URL"] = login_url
+    deep_link = CONFIG["DEEP_LINK"]
+    CONFIG["DEEP_LINK"] = False
+    # Every run holds its browser until all of them are up, so the sessions really overlap.
+    all_up = threading.Barrier(runs, timeout=120)
+
+    def run_one(index):
+        try:
+            with feedback_automator.launch_chrome() as driver:
+                profile_dir = driver.profile_dir
+                port = driver.capabilities["goog:chromeOptions"]["debuggerAddress"].rpartition(":")[2]
+                all_up.wait()
+                started = time.perf_counter()
+                steps = feedback_automator._automation_steps(driver, f"bench{index}", "bench", progress_events.RunTracker())
+                try:
+                    while True:
+                        next(steps)
+                except StopIteration as stop:
+                    outcome, _ = stop.value
+        except Exception:
+            all_up.abort()  # Lets the other runs give up instead of waiting for one that never came up.
+            raise
+        return profile_dir, port, outcome, time.perf_counter() - started
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=runs) as executor:
+            results = list(executor.map(run_one, range(runs)))
+    finally:
+        CONFIG["DEEP_LINK"] = deep_link
+        server.shutdown()
+
+    profile_dirs, ports, outcomes, durations = zip(*results)
+    print(f"Concurrent runs:        {runs}")
+    print(f"Profile folders:        {len(set(profile_dirs))} distinct")
+    print(f"Debugging ports:        {len(set(ports))} distinct ({', '.join(sorted(ports))})")
+    print(f"Outcomes:               {', '.join(outcomes)}")
+    print(f"Run time:               {min(durations):.2f} s to {max(durations):.2f} s")
+    assert len(set(profile_dirs)) == runs, "two runs shared a profile folder"
+    assert len(set(ports)) == runs, "two runs shared a debugging port"
+    assert all(outcome == "success" for outcome in outcomes), f"not every run succeeded: {outcomes}"
+    leftover = [profile_dir for profile_dir in profile_dirs if os.path.exists(profile_dir)]
+    assert not leftover, f"profile folders left behind: {leftover}"
+    print("OK: every run had its own profile and port, succeeded, and cleaned up its profile.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    memory = sub.add_parser("memory", help="memory per concurrent run, process vs. browser context")
+    memory.add_argument("--runs", type=int, default=5)
+    memory.add_argument("--url", default=CONFIG["LOGIN_URL"])
+
+    fill = sub.add_parser("fill", help="fill stage on the mock form, per-row round trips vs. batched script")
+    fill.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000])
+
+    waits = sub.add_parser("waits", help="time spent waiting per run, 0.5 s polling vs. DOM-change wake-ups")
+    waits.add_argument("--runs", type=int, default=5)
+    waits.add_argument("--render-delay", type=float, default=0.3)
+
+    concurrency = sub.add_parser("concurrency", help="overlapping launch_chrome() runs: own profile and port each, all succeed")
+    concurrency.add_argument("--runs", type=int, default=4)
+
+    args = parser.parse_args()
+    if args.command == "memory":
+        bench_memory(args.runs, args.url)
+    elif args.command == "fill":
+        bench_fill(args.rows)
+    elif args.command == "waits":
+        bench_waits(args.runs, args.render_delay)
+    elif args.command == "concurrency":
+        bench_concurrency(args.runs)
+
+
+if __name__ == "__main__":
+    main()
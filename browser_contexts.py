@@ -0,0 +1,112 @@
+import contextlib
+import threading
+
+from chrome_procs import driver_service_pid, process_tree_rss
+
+
+class SharedBrowser:
+    """
+    Hosts many isolated runs inside one long-lived Chrome process.
+
+    Every lease gets a fresh CDP browser context (its own cookie jar and storage) with a
+    single tab in it. A separate chromedriver session is attached to the shared Chrome for
+    each lease, so concurrent runs never fight over the driver's current window.
+    """
+
+    def __init__(self, driver_factory, driver_closer, attach_driver):
+        self._driver_factory = driver_factory
+        self._driver_closer = driver_closer
+        self._attach_driver = attach_driver
+        self._lock = threading.Lock()
+        self._host = None
+        self._active = {}  # browserContextId -> (account, attached driver)
+
+    # --- Host browser ---
+
+    def _ensure_host(self):
+        with self._lock:
+            if self._host is not None:
+                try:
+                    self._host.current_window_handle
+                    return self._host
+                except Exception:
+                    self._close_host()
+            self._host = self._driver_factory()
+            return self._host
+
+    def _close_host(self):
+        host, self._host = self._host, None
+        self._active.clear()
+        try:
+            self._driver_closer(host)
+        except Exception:
+            pass
+
+    def _host_cdp(self, cmd, params):
+        with self._lock:
+            return self._host.execute_cdp_cmd(cmd, params)
+
+    def close(self):
+        """Quits the shared Chrome process and every context inside it."""
+        with self._lock:
+            if self._host is not None:
+                self._close_host()
+
+    # --- Leasing ---
+
+    @contextlib.contextmanager
+    def lease(self, account=None):
+        """Context manager that yields a driver bound to a new, isolated browser context."""
+        host = self._ensure_host()
+        debugger_address = host.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        context_id = self._host_cdp("Target.createBrowserContext", {"disposeOnDetach": False})["browserContextId"]
+        driver = None
+        try:
+            target_id = self._host_cdp(
+                "Target.createTarget", {"url": "about:blank", "browserContextId": context_id}
+            )["targetId"]
+            driver = self._attach_driver(debugger_address)
+            driver.switch_to.window(self._handle_for_target(driver, target_id))
+            with self._lock:
+                self._active[context_id] = (account, driver)
+            yield driver
+        finally:
+            with self._lock:
+                self._active.pop(context_id, None)
+            if driver is not None:
+                try:
+                    driver.quit()  # Detaches chromedriver; the shared Chrome keeps running.
+                except Exception:
+                    pass
+            try:
+                # Closes the context's tabs and throws away its cookies and storage.
+                self._host_cdp("Target.disposeBrowserContext", {"browserContextId": context_id})
+            except Exception:
+                pass
+
+    @staticmethod
+    def _handle_for_target(driver, target_id):
+        # Depending on the chromedriver version, window handles are either the bare target ID
+        # or the target ID with a "CDwindow-" prefix.
+        for handle in driver.window_handles:
+            if handle == target_id or handle.endswith(target_id):
+                return handle
+        raise RuntimeError(f"Tab for browser context target {target_id} was not found.")
+
+    # --- Reporting ---
+
+    def stats(self):
+        """Reports active contexts and the memory they cost, including attached chromedrivers."""
+        with self._lock:
+            host = self._host
+            active = list(self._active.values())
+        host_bytes = process_tree_rss(driver_service_pid(host)) if host is not None else 0
+        attached_bytes = sum(process_tree_rss(driver_service_pid(driver)) for _, driver in active)
+        total = host_bytes + attached_bytes
+        return {
+            "running": host is not None,
+            "active_contexts": len(active),
+            "accounts": sorted({account for account, _ in active if account}),
+            "memory_bytes": total,
+            "memory_bytes_per_run": total // len(active) if active else 0,
+        }
@@ -0,0 +1,228 @@
+import collections
+import contextlib
+import threading
+import time
+
+from chrome_procs import driver_service_pid, process_tree_rss
+
+
+class BrowserPoolTimeout(Exception):
+    """Raised when no browser session becomes available within the lease timeout."""
+
+
+class PooledSession:
+    """A warm Chrome session together with the bookkeeping the pool needs to recycle it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.runs = 0
+        self.created_at = time.monotonic()
+
+    def memory_bytes(self):
+        return process_tree_rss(driver_service_pid(self.driver))
+
+
+class BrowserPool:
+    """
+    Keeps a set of pre-launched headless Chrome sessions and leases one per automation run.
+
+    Sessions are reset between leases and recycled after `max_runs` runs or once their
+    process tree grows past `max_memory_mb`.
+    """
+
+    def __init__(self, driver_factory, driver_closer, min_size=1, max_size=4, max_runs=20,
+                 max_memory_mb=700, lease_timeout=60, reset_origins=()):
+        self._driver_factory = driver_factory
+        self._driver_closer = driver_closer
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.max_runs = max_runs
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024 if max_memory_mb else 0
+        self.lease_timeout = lease_timeout
+        self.reset_origins = list(reset_origins)
+
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._size = 0  # Live sessions, including leased ones and ones being launched.
+        self._leased = 0
+        self._closed = False
+        self._wait_times = collections.deque(maxlen=500)
+        self._created = 0
+        self._retired = 0
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Launches the minimum number of sessions in the background."""
+        threading.Thread(target=self._top_up, name="browser-pool-warmup", daemon=True).start()
+        return self
+
+    def close(self):
+        """Quits every idle session. Leased sessions are quit when they are returned."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            self._quit(session)
+
+    def _launch(self):
+        driver = self._driver_factory()
+        with self._cond:
+            self._created += 1
+        return PooledSession(driver)
+
+    def _quit(self, session):
+        try:
+            self._driver_closer(session.driver)
+        except Exception:
+            pass
+
+    def _top_up(self):
+        """Launches sessions until the pool holds at least `min_size` of them."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                session = self._launch()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                return
+            with self._cond:
+                if not self._closed:
+                    self._idle.append(session)
+                    self._cond.notify()
+                    continue
+                self._size -= 1
+            self._quit(session)
+            return
+
+    # --- Leasing ---
+
+    @contextlib.contextmanager
+    def lease(self, account=None):
+        """
+        Context manager that yields a ready driver and returns it to the pool afterwards.
+
+        `account` is accepted for interface parity with SharedBrowser and is not used.
+        """
+        session = self._acquire()
+        try:
+            yield session.driver
+        finally:
+            self._release(session)
+
+    def _acquire(self):
+        started = time.monotonic()
+        deadline = started + self.lease_timeout
+        while True:
+            launch = False
+            with self._cond:
+                while not self._idle and self._size >= self.max_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise BrowserPoolTimeout(
+                            f"No browser session became available within {self.lease_timeout}s."
+                        )
+                    self._cond.wait(remaining)
+                if self._closed:
+                    raise BrowserPoolTimeout("The browser pool has been closed.")
+                if self._idle:
+                    session = self._idle.popleft()
+                else:
+                    self._size += 1
+                    launch = True
+
+            if launch:
+                try:
+                    session = self._launch()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_alive(session):
+                self._retire(session)
+                continue
+
+            with self._cond:
+                self._leased += 1
+                self._wait_times.append(time.monotonic() - started)
+            return session
+
+    def _release(self, session):
+        session.runs += 1
+        with self._cond:
+            self._leased -= 1
+
+        if (self._closed or session.runs >= self.max_runs
+                or (self.max_memory_bytes and session.memory_bytes() > self.max_memory_bytes)
+                or not self._reset(session.driver)):
+            self._retire(session)
+            return
+
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _retire(self, session):
+        self._quit(session)
+        with self._cond:
+            self._size -= 1
+            self._retired += 1
+            self._cond.notify()
+        if not self._closed:
+            threading.Thread(target=self._top_up, name="browser-pool-refill", daemon=True).start()
+
+    # --- Session hygiene ---
+
+    @staticmethod
+    def _is_alive(session):
+        try:
+            session.driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        """Clears cookies, storage and extra windows so the next lease starts clean."""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.switch_to.default_content()
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            for origin in self.reset_origins:
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            driver.get("about:blank")
+            return True
+        except Exception:
+            return False
+
+    # --- Reporting ---
+
+    def stats(self):
+        """Returns a snapshot of pool occupancy and lease wait times (in seconds)."""
+        with self._cond:
+            waits = sorted(self._wait_times)
+            snapshot = {
+                "size": self._size,
+                "idle": len(self._idle),
+                "leased": self._leased,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "created": self._created,
+                "retired": self._retired,
+            }
+        snapshot["lease_wait_p50"] = waits[len(waits) // 2] if waits else 0.0
+        snapshot["lease_wait_p95"] = waits[int(len(waits) * 0.95)] if waits else 0.0
+        snapshot["lease_wait_max"] = waits[-1] if waits else 0.0
+        return snapshot
@@ -0,0 +1,114 @@
+import os
+
+# Helpers for inspecting the Chrome process tree that sits behind a chromedriver.
+# They read /proc directly, so on platforms without it they simply report nothing.
+
+PROC_ROOT = "/proc"
+
+
+def _read_proc_file(pid, name):
+    """Returns the contents of /proc/<pid>/<name>, or None if it cannot be read."""
+    try:
+        with open(os.path.join(PROC_ROOT, str(pid), name), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def list_pids():
+    """Returns the pids of every process currently visible in /proc."""
+    try:
+        return [int(entry) for entry in os.listdir(PROC_ROOT) if entry.isdigit()]
+    except OSError:
+        return []
+
+
+CHROME_NAMES = (b"chrome", b"chromium", b"chromium-browse", b"headless_shell", b"chromedriver")
+
+
+def chrome_pids():
+    """Returns the pids of every Chrome and chromedriver process on this host."""
+    pids = []
+    for pid in list_pids():
+        comm = _read_proc_file(pid, "comm")
+        if comm and comm.strip() in CHROME_NAMES:
+            pids.append(pid)
+    return pids
+
+
+def cmdline(pid):
+    """Returns the command-line arguments of a process, or [] if it has gone away."""
+    raw = _read_proc_file(pid, "cmdline")
+    return [arg.decode(errors="replace") for arg in raw.split(b"\0") if arg] if raw else []
+
+
+def environ_value(pid, name):
+    """Returns one environment variable of a process, or None if unset or unreadable."""
+    raw = _read_proc_file(pid, "environ")
+    if not raw:
+        return None
+    prefix = name.encode() + b"="
+    for entry in raw.split(b"\0"):
+        if entry.startswith(prefix):
+            return entry[len(prefix):].decode(errors="replace")
+    return None
+
+
+def process_group(pid):
+    """Returns the process group id of a process, or None if it has gone away."""
+    stat = _read_proc_file(pid, "stat")
+    if not stat:
+        return None
+    return int(stat[stat.rfind(b")") + 2:].split()[2])
+
+
+def parent_pid(pid):
+    """Returns the parent pid of a process, or None if it has gone away."""
+    stat = _read_proc_file(pid, "stat")
+    if not stat:
+        return None
+    # The command name is wrapped in parentheses and may itself contain spaces.
+    fields = stat[stat.rfind(b")") + 2:].split()
+    return int(fields[1])
+
+
+def descendants(pid):
+    """Returns the pids of every process below `pid` in the process tree."""
+    children = {}
+    for candidate in list_pids():
+        ppid = parent_pid(candidate)
+        if ppid is not None:
+            children.setdefault(ppid, []).append(candidate)
+
+    found = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def rss_bytes(pid):
+    """Returns the resident set size of a single process in bytes."""
+    status = _read_proc_file(pid, "status")
+    if not status:
+        return 0
+    for line in status.splitlines():
+        if line.startswith(b"VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+def process_tree_rss(pid):
+    """Returns the combined RSS of a process and all of its descendants in bytes."""
+    if pid is None:
+        return 0
+    return rss_bytes(pid) + sum(rss_bytes(child) for child in descendants(pid))
+
+
+def driver_service_pid(driver):
+    """Returns the chromedriver pid behind a Selenium driver, if it was started locally."""
+    service = getattr(driver, "service", None)
+    process = getattr(service, "process", None)
+    return getattr(process, "pid", None)
@@ -0,0 +1,165 @@
+import os
+import re
+import shutil
+import signal
+import threading
+import time
+
+from chrome_procs import cmdline, descendants, environ_value, list_pids, process_group
+from shared_store import pid_alive
+
+# Every chromedriver this app starts carries OWNER_ENV (the pid of the web worker that started
+# it) in its environment, and runs in its own process group together with the Chrome it
+# launches. Profile folders are named griet-chrome-<owner pid>-*. That is enough to tell,
+# from /proc alone, which browsers and profiles still belong to a live run.
+
+OWNER_ENV = "GRIET_OWNER_PID"
+PROFILE_PREFIX = "griet-chrome-"
+_PROFILE_NAME = re.compile(rf"^{PROFILE_PREFIX}(\d+)-")
+
+
+def _owner_of_profile(path):
+    match = _PROFILE_NAME.match(os.path.basename(path.rstrip(os.sep)))
+    return int(match.group(1)) if match else None
+
+
+def _profile_arg(args):
+    for arg in args:
+        if arg.startswith("--user-data-dir="):
+            return arg.split("=", 1)[1]
+    return None
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ChromeReaper:
+    """
+    Periodically kills Chrome/chromedriver processes and deletes profile folders that no live
+    run owns: those left by web workers that crashed or were killed, and those this worker
+    lost track of (for example when driver.quit() failed).
+
+    `live_profiles()` returns the profile folders this worker's runs are using right now.
+    `on_reap(report)`, if given, is called after every pass that reclaimed something.
+    """
+
+    def __init__(self, profile_roots, live_profiles, interval=60, min_profile_age=60, on_reap=None):
+        self.profile_roots = list(dict.fromkeys(profile_roots))
+        self.live_profiles = live_profiles
+        self.interval = interval
+        self.min_profile_age = min_profile_age
+        self.on_reap = on_reap
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._totals = {"passes": 0, "processes_killed": 0, "profiles_removed": 0, "bytes_reclaimed": 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="chrome-reaper", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+
+    def _loop(self):
+        # The first pass runs right away, so a restarted container cleans up before serving runs.
+        while True:
+            try:
+                self.reap_once()
+            except Exception:
+                pass  # A failed pass must not stop the reaper; the next one starts from scratch.
+            if self._stop.wait(self.interval):
+                return
+
+    def _is_orphan(self, owner, profile_dir, live):
+        if owner is None:
+            return False
+        if owner != os.getpid():
+            return not pid_alive(owner)
+        # Our own browser: it is leaked once its profile is no longer tracked by a run.
+        return profile_dir is not None and profile_dir not in live
+
+    def reap_once(self):
+        """Runs one pass and returns what it reclaimed."""
+        live = set(self.live_profiles())
+        report = {"processes_killed": 0, "profiles_removed": 0, "bytes_reclaimed": 0}
+
+        killed = set()
+        for pid in list_pids():
+            if pid in killed:
+                continue
+            owner = environ_value(pid, OWNER_ENV)
+            if owner is None or not owner.isdigit():
+                continue
+            owner = int(owner)
+            profile_dir = _profile_arg(cmdline(pid))
+            if not self._is_orphan(owner, profile_dir, live):
+                continue
+            # A leaked Chrome of this worker may only be reaped by its profile, never by owner alone.
+            if owner == os.getpid() and profile_dir is None:
+                continue
+            report["processes_killed"] += self._kill(pid, owner, killed)
+
+        for root in self.profile_roots:
+            try:
+                entries = os.listdir(root)
+            except OSError:
+                continue
+            for name in entries:
+                path = os.path.join(root, name)
+                owner = _owner_of_profile(path)
+                if owner is None or not self._is_orphan(owner, path, live):
+                    continue
+                try:
+                    if time.time() - os.stat(path).st_mtime < self.min_profile_age:
+                        continue  # Possibly a profile whose Chrome is still starting.
+                except OSError:
+                    continue
+                size = _tree_size(path)
+                shutil.rmtree(path, ignore_errors=True)
+                if not os.path.exists(path):
+                    report["profiles_removed"] += 1
+                    report["bytes_reclaimed"] += size
+
+        with self._lock:
+            self._totals["passes"] += 1
+            for key, value in report.items():
+                self._totals[key] += value
+        if self.on_reap is not None and any(report.values()):
+            self.on_reap(report)
+        return report
+
+    @staticmethod
+    def _kill(pid, owner, killed):
+        """
+        Kills an orphan with everything below it and, when its process group was started for
+        the same owner (a chromedriver and its Chrome), the whole group. Returns how many died.
+        """
+        victims = [pid] + descendants(pid)
+        group = process_group(pid)
+        if group not in (None, os.getpgrp()) and environ_value(group, OWNER_ENV) == str(owner):
+            victims += [other for other in list_pids() if process_group(other) == group]
+        count = 0
+        for victim in dict.fromkeys(victims):
+            if victim in killed:
+                continue
+            try:
+                os.kill(victim, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                continue
+            killed.add(victim)
+            count += 1
+        return count
+
+    def stats(self):
+        with self._lock:
+            return dict(self._totals)
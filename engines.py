@@ -0,0 +1,54 @@
+import portal_health
+import progress_events
+from automator_config import CONFIG
+
+ENGINES = ("selenium", "http")
+
+
+def run_automation(username, password, engine=None, pool=None):
+    """
+    Runs the automation with the chosen engine and yields its progress events.
+
+    The HTTP engine falls back to Selenium automatically when it cannot parse a portal page.
+    Engines are imported lazily, so choosing "http" never loads Selenium unless it has to.
+
+    While the portal circuit breaker is open (see portal_health.py), the run ends at once with
+    the "portal_unavailable" outcome, before any browser is started.
+    """
+    engine = engine or CONFIG["ENGINE"]
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Choose one of: {', '.join(ENGINES)}.")
+
+    try:
+        trial = portal_health.admit()
+    except portal_health.PortalUnavailable as e:
+        # Not a RunTracker outcome: a refusal must not drag down the run durations in run_timings.
+        yield progress_events.outcome("portal_unavailable", f"❌ {e}\n", duration=0.0, stages={})
+        return
+    if trial:
+        yield progress_events.log("The portal was failing recently. This run is the trial that decides whether runs resume.\n")
+
+    outcome = None
+    try:
+        for event in _run_engine(username, password, engine, pool):
+            if event["type"] == "outcome":
+                outcome = event["outcome"]
+            yield event
+    finally:
+        portal_health.record(outcome, trial)
+
+
+def _run_engine(username, password, engine, pool):
+    run = progress_events.RunTracker()
+    if engine == "http":
+        from http_engine import PortalParseError, run_feedback_automation_http
+
+        try:
+            yield from run_feedback_automation_http(username, password, run)
+            return
+        except PortalParseError as e:
+            yield progress_events.warning(f"\n⚠️ The HTTP engine could not read the portal ({e}). Falling back to the browser...\n\n")
+
+    from feedback_automator import run_feedback_automation
+
+    yield from run_feedback_automation(username, password, pool=pool, run=run)
@@ -0,0 +1,81 @@
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Resolves when the page's DOM changes, or after `idle` milliseconds at the latest. A single
+# MutationObserver per document bumps a version counter; a wait that already saw an older
+# version returns at once, so a change between two checks is never slept through.
+_WAIT_FOR_MUTATION_JS = """
+var seen = arguments[0], idle = arguments[1], done = arguments[arguments.length - 1];
+var state = window.__grietDom;
+if (!state) {
+    state = window.__grietDom = {version: 0, waiters: []};
+    new MutationObserver(function () {
+        state.version++;
+        var waiters = state.waiters;
+        state.waiters = [];
+        waiters.forEach(function (wake) { wake(); });
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+if (seen !== null && seen !== state.version) {
+    done(state.version);
+    return;
+}
+var finished = false;
+function wake() {
+    if (!finished) {
+        finished = true;
+        done(state.version);
+    }
+}
+state.waiters.push(wake);
+setTimeout(wake, idle);
+"""
+
+
+class EventWait(WebDriverWait):
+    """
+    A WebDriverWait that re-checks its condition as soon as the DOM changes instead of
+    sleeping a fixed poll interval. It accepts the same expected_conditions.
+
+    `poll_frequency` becomes the longest the wait idles without a DOM change, which covers
+    conditions no mutation reveals (layout, timers). A navigation ends the idle wait too,
+    because the in-page script is dropped with the old document.
+    """
+
+    def until(self, method, message=""):
+        return self._wait(method, message, until_not=False)
+
+    def until_not(self, method, message=""):
+        return self._wait(method, message, until_not=True)
+
+    def _wait(self, method, message, until_not):
+        # Same loop as WebDriverWait.until/until_not, with the sleep replaced by a DOM wait.
+        screen = None
+        stacktrace = None
+        seen = None
+        end_time = time.monotonic() + self._timeout
+        while True:
+            try:
+                value = method(self._driver)
+                if bool(value) != until_not:
+                    return value
+            except self._ignored_exceptions as exc:
+                if until_not:
+                    return True
+                screen = getattr(exc, "screen", None)
+                stacktrace = getattr(exc, "stacktrace", None)
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
+                break
+            seen = self._wait_for_mutation(seen, min(remaining, self._poll))
+        raise TimeoutException(message, screen, stacktrace)
+
+    def _wait_for_mutation(self, seen, idle):
+        """Blocks until the DOM version differs from `seen` or `idle` seconds pass. Returns the new version."""
+        try:
+            return self._driver.execute_async_script(_WAIT_FOR_MUTATION_JS, seen, int(idle * 1000))
+        except WebDriverException:
+            # The document went away (navigation), or an alert is open: re-check right away.
+            return None
@@ -1,17 +1,33 @@
+import atexit
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
 import time
+from urllib.parse import urlsplit
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait, Select
+from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
-def run_feedback_automation(username, password):
-    """
-    Runs the GRIET feedback automation in a Docker environment where Chrome is pre-installed.
-    """
-    
-    # --- Configure Chrome for Headless Operation on a Server ---
+import portal_limiter
+import portal_links
+import progress_events
+import session_cache
+from automator_config import CONFIG
+from chrome_reaper import OWNER_ENV, PROFILE_PREFIX
+from event_wait import EventWait
+from page_ops import count_commands, fill_ratings, login_state, mark_login_submitted, read_select_options
+from portal_errors import InvalidCredentialsError, PortalErrorPage, PortalFailure
+from resource_blocking import format_report
+
+
+def build_chrome_options(user_data_dir, debugging_port=0):
+    """Configures Chrome for headless operation on a server."""
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
@@ -21,95 +37,354 @@ def run_feedback_automation(username, password):
     # --- NEW ARGUMENTS TO FIX THE CRASH ---
     # Tells Chrome not to try using a GPU, which doesn't exist on the server.
     chrome_options.add_argument("--disable-gpu")
-    # Tells Chrome to use a temporary folder for its user data, fixing the "directory in use" error.
-    chrome_options.add_argument("--user-data-dir=/tmp/user-data")
-    chrome_options.add_argument("--remote-debugging-port=9222")
-
-
-    # --- Configuration ---
-    CONFIG = {
-        "LOGIN_URL": "http://webprosindia.com/Gokaraju/",
-        "TERM_VALUE_TO_SELECT": "1",
-        "SUBMIT_FORM": False,
-        "SELECTORS": {
-            "username_field_id": "txtId2",
-            "password_field_id": "txtPwd2",
-            "login_button_id": "imgBtn2",
-            "feedback_link_text": "FEEDBACK",
-            "iframe_name": "capIframe",
-            "term_dropdown_id": "ctl00_CapPlaceHolder_ddlExams",
-            "question_rows_xpath": "//table[contains(@id, 'gvStudentFeedback')]//tr[.//input[@type='radio']]",
-            "submit_button_id": "ContentPlaceHolder1_btnSubmit"
-        },
-        "RATINGS": { "default": 4 }
-    }
-
-    with webdriver.Chrome(options=chrome_options) as driver:
-        wait = WebDriverWait(driver, 25)
-        
+    # Every session gets its own profile folder, so concurrent runs never hit the "directory in use" error.
+    chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
+    # Port 0 lets Chrome pick a free port itself; chromedriver reads it back from the profile folder.
+    chrome_options.add_argument(f"--remote-debugging-port={debugging_port}")
+    _enable_network_log(chrome_options)
+    return chrome_options
+
+
+def _enable_network_log(chrome_options):
+    # The performance log lets resource_blocking.py count what was loaded and what was blocked.
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+
+def chrome_service():
+    """
+    A chromedriver service tagged with this worker's pid and started in its own process group,
+    so chrome_reaper.py can tell whose browser it is and kill it with all of its children.
+    """
+    popen_kw = {"start_new_session": True} if os.name == "posix" else {}
+    return Service(env={**os.environ, OWNER_ENV: str(os.getpid())}, popen_kw=popen_kw)
+
+
+# --- Per-Session Chrome Profiles ---
+# Profile folders that belong to Chrome sessions started by this process.
+_live_profile_dirs = set()
+_profile_lock = threading.Lock()
+
+
+def profile_root():
+    """Picks the folder for Chrome profiles, preferring tmpfs when it has room."""
+    configured = os.environ.get("CHROME_PROFILE_ROOT")
+    if configured:
+        return configured
+    try:
+        if shutil.disk_usage("/dev/shm").free >= 256 * 1024 * 1024:
+            return "/dev/shm"
+    except OSError:
+        pass
+    return tempfile.gettempdir()
+
+
+def create_driver():
+    """Launches a new headless Chrome session with its own profile folder and debugging port."""
+    profile_dir = tempfile.mkdtemp(prefix=f"{PROFILE_PREFIX}{os.getpid()}-", dir=profile_root())
+    with _profile_lock:
+        _live_profile_dirs.add(profile_dir)
+    try:
+        driver = webdriver.Chrome(options=build_chrome_options(profile_dir), service=chrome_service())
+    except Exception:
+        _remove_profile(profile_dir)
+        raise
+    driver.profile_dir = profile_dir
+    return driver
+
+
+def close_driver(driver):
+    """Quits a driver made by create_driver and deletes its profile folder."""
+    try:
+        driver.quit()
+    finally:
+        _remove_profile(getattr(driver, "profile_dir", None))
+
+
+def _remove_profile(profile_dir):
+    if not profile_dir:
+        return
+    shutil.rmtree(profile_dir, ignore_errors=True)
+    with _profile_lock:
+        _live_profile_dirs.discard(profile_dir)
+
+
+@atexit.register
+def _remove_leftover_profiles():
+    for profile_dir in list(_live_profile_dirs):
+        _remove_profile(profile_dir)
+
+
+def attach_driver(debugger_address):
+    """Starts a chromedriver session attached to an already running Chrome."""
+    chrome_options = Options()
+    chrome_options.debugger_address = debugger_address
+    _enable_network_log(chrome_options)
+    return webdriver.Chrome(options=chrome_options, service=chrome_service())
+
+
+@contextlib.contextmanager
+def launch_chrome():
+    """Context manager around create_driver that always quits Chrome and cleans up its profile."""
+    driver = create_driver()
+    try:
+        yield driver
+    finally:
+        close_driver(driver)
+
+
+def create_browser_pool():
+    """Builds and warms a BrowserPool from CONFIG['BROWSER_POOL']."""
+    from browser_pool import BrowserPool
+
+    settings = CONFIG["BROWSER_POOL"]
+    login_url = urlsplit(CONFIG["LOGIN_URL"])
+    return BrowserPool(
+        create_driver,
+        close_driver,
+        min_size=settings["MIN_SIZE"],
+        max_size=settings["MAX_SIZE"],
+        max_runs=settings["MAX_RUNS_PER_SESSION"],
+        max_memory_mb=settings["MAX_MEMORY_MB"],
+        lease_timeout=settings["LEASE_TIMEOUT"],
+        reset_origins=[f"{login_url.scheme}://{login_url.netloc}"],
+    ).start()
+
+
+def create_shared_browser():
+    """Builds a SharedBrowser that runs every automation in its own context of one Chrome."""
+    from browser_contexts import SharedBrowser
+
+    return SharedBrowser(create_driver, close_driver, attach_driver)
+
+
+def create_chrome_reaper(on_reap=None):
+    """Starts a ChromeReaper over this worker's profile folders, configured from CONFIG['CHROME_REAPER']."""
+    from chrome_reaper import ChromeReaper
+
+    def live_profiles():
+        with _profile_lock:
+            return set(_live_profile_dirs)
+
+    settings = CONFIG["CHROME_REAPER"]
+    return ChromeReaper(
+        [profile_root(), tempfile.gettempdir()],
+        live_profiles,
+        interval=settings["INTERVAL"],
+        min_profile_age=settings["MIN_PROFILE_AGE"],
+        on_reap=on_reap,
+    ).start()
+
+
+# --- Resource Blocking ---
+_resource_blocker = None
+
+
+def ensure_resource_blocking(driver):
+    """Installs the shared ResourceBlocker on a driver once. Returns None when blocking is disabled."""
+    global _resource_blocker
+    settings = CONFIG["RESOURCE_BLOCKING"]
+    if not settings["ENABLED"]:
+        return None
+    if _resource_blocker is None:
+        from resource_blocking import ResourceBlocker
+
+        _resource_blocker = ResourceBlocker(
+            block_types=settings["BLOCK_TYPES"],
+            block_patterns=settings["BLOCK_PATTERNS"],
+            allow_patterns=settings["ALLOW_PATTERNS"],
+            block_third_party_scripts=settings["BLOCK_THIRD_PARTY_SCRIPTS"],
+            first_party_hosts=[urlsplit(CONFIG["LOGIN_URL"]).hostname],
+        )
+    if getattr(driver, "resource_blocker", None) is not _resource_blocker:
+        _resource_blocker.install(driver)
+    else:
+        _resource_blocker.drain(driver)  # Discard traffic left over from the previous lease.
+    return _resource_blocker
+
+
+def run_feedback_automation(username, password, pool=None, run=None):
+    """
+    Runs the GRIET feedback automation in a Docker environment where Chrome is pre-installed.
+
+    Yields progress events (see progress_events.py); the last one is always the outcome.
+    If a BrowserPool or SharedBrowser is given, the driver is leased from it instead of
+    launching a new Chrome. `run` lets a caller continue an existing RunTracker.
+    """
+    run = run or progress_events.RunTracker()
+    yield from run.stage("startup", "Initializing automation...\n")
+    with (pool.lease(username) if pool is not None else launch_chrome()) as driver, \
+            count_commands(driver) as commands:
+        blocker = ensure_resource_blocking(driver)
+
         try:
-            yield "Initializing automation...\n"
-            yield "Navigating to login page...\n"
+            outcome, message = yield from _automation_steps(driver, username, password, run)
+        except PortalFailure as e:
+            outcome, message = e.outcome, e.log_line()
+        except TimeoutException as e:
+            outcome, message = "timeout", f"\n❌ A timeout occurred. The page took too long to load an element.\nError details: {e}"
+        except Exception as e:
+            outcome, message = "error", f"\n❌ An unexpected error occurred: {e}"
+
+        if blocker is not None:
+            report = blocker.drain(driver)
+            yield progress_events.log("\n" + format_report(report), resources=report)
+
+    yield from run.outcome(outcome, message, commands=commands["commands"])
+
+
+def _wait_for_login(driver):
+    """
+    Waits for the login postback to settle, racing the dashboard against the portal's failure
+    signals so a wrong password ends the run as soon as the portal answers.
+    """
+    selectors = CONFIG['SELECTORS']
+
+    def settled(d):
+        result = login_state(d, selectors['feedback_link_text'], selectors['username_field_id'], CONFIG['LOGIN_ERROR_TEXTS'])
+        return result if result['state'] != 'pending' else False
+
+    result = EventWait(driver, CONFIG['PAGE_TIMEOUT'], poll_frequency=0.25).until(settled)
+    if result['state'] == 'invalid_credentials':
+        raise InvalidCredentialsError(result.get('detail') or 'no details given')
+    if result['state'] == 'portal_error':
+        raise PortalErrorPage(result.get('detail') or 'no details given')
+
+
+def _resume_session(driver, username, password, run):
+    """
+    Restores a saved portal session (see session_cache.py) and opens the dashboard with it.
+    Returns True when the dashboard came up, False after dropping a session that no longer works.
+    """
+    saved = session_cache.load(username, password)
+    if saved is None:
+        return False
+    yield from run.stage("resume_session", "Reusing the saved portal session...\n")
+    for cookie in saved['cookies']:
+        # Network.setCookie needs no page of the portal's domain to be open, unlike add_cookie().
+        params = {key: cookie[key] for key in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly') if key in cookie}
+        driver.execute_cdp_cmd("Network.setCookie", {**params, 'url': CONFIG['LOGIN_URL']})
+    with portal_limiter.request():
+        driver.get(saved['dashboard_url'])
+    selectors = CONFIG['SELECTORS']
+    state = login_state(driver, selectors['feedback_link_text'], selectors['username_field_id'], CONFIG['LOGIN_ERROR_TEXTS'])
+    if portal_links.same_page(saved['dashboard_url'], driver.current_url) and state['state'] == 'success':
+        yield progress_events.log("✅ Saved session is still valid. Skipping the login form.\n")
+        return True
+    session_cache.rejected(username)
+    driver.delete_all_cookies()
+    yield progress_events.warning("⚠️ The saved session has expired. Logging in again...\n")
+    return False
+
+
+def _open_feedback_directly(driver, run):
+    """
+    Opens the cached feedback page URL in place of the dashboard, skipping the FEEDBACK page
+    and its frame. Returns False, back on the dashboard, when there is no cached URL or the
+    portal redirected it elsewhere or served something other than the feedback form.
+    """
+    deep_link = portal_links.feedback_page_url()
+    if not deep_link:
+        return False
+    yield from run.stage("open_feedback", "On dashboard. Opening the feedback page directly...\n")
+    dashboard_url = driver.current_url
+    with portal_limiter.request():
+        driver.get(deep_link)
+    if (portal_links.same_page(deep_link, driver.current_url)
+            and driver.find_elements(By.ID, CONFIG['SELECTORS']['term_dropdown_id'])):
+        return True
+    portal_links.forget_feedback_page_url()
+    yield progress_events.warning("⚠️ The direct link to the feedback page was redirected. Using the FEEDBACK link instead...\n")
+    with portal_limiter.request():
+        driver.get(dashboard_url)
+    return False
+
+
+def _automation_steps(driver, username, password, run):
+    """
+    Drives the portal from the login page to the filled feedback form, yielding progress
+    events. Returns the (outcome, message) the run ended with.
+    """
+    # Waits wake up on DOM changes instead of polling every 0.5 s (see event_wait.py). Every
+    # navigation or postback, with the wait for its page, counts as one request to the portal
+    # for the host-wide rate limit (see portal_limiter.py). Nothing is yielded inside those
+    # blocks: a paused generator would hold its login slot and stretch the timed request. A
+    # stage that begins mid-request is started there with run.stage(), which only stamps the
+    # time, and its events are yielded once the block is done.
+    wait = EventWait(driver, CONFIG['PAGE_TIMEOUT'])
+
+    resumed = yield from _resume_session(driver, username, password, run)
+    if not resumed:
+        yield from run.stage("open_login", "Navigating to login page...\n")
+        with portal_limiter.request():
             driver.get(CONFIG['LOGIN_URL'])
-            
-            wait.until(EC.presence_of_element_located((By.ID, CONFIG['SELECTORS']['username_field_id']))).send_keys(username)
-            driver.find_element(By.ID, CONFIG['SELECTORS']['password_field_id']).send_keys(password)
-            driver.find_element(By.ID, CONFIG['SELECTORS']['login_button_id']).click()
-            yield "Login submitted. Waiting for dashboard...\n"
-
-            feedback_link = wait.until(EC.element_to_be_clickable((By.LINK_TEXT, CONFIG['SELECTORS']['feedback_link_text'])))
-            yield "On dashboard. Clicking 'FEEDBACK' link...\n"
-            feedback_link.click()
 
-            yield "Switching to the feedback iframe...\n"
+        wait.until(EC.presence_of_element_located((By.ID, CONFIG['SELECTORS']['username_field_id']))).send_keys(username)
+        driver.find_element(By.ID, CONFIG['SELECTORS']['password_field_id']).send_keys(password)
+        with portal_limiter.login_slot():
+            mark_login_submitted(driver)
+            with portal_limiter.request():
+                driver.find_element(By.ID, CONFIG['SELECTORS']['login_button_id']).click()
+                login_stage = run.stage("login", "Login submitted. Waiting for dashboard...\n")
+                _wait_for_login(driver)
+        yield from login_stage
+        session_cache.store(username, password, driver.get_cookies(), driver.current_url)
+
+    opened_directly = yield from _open_feedback_directly(driver, run)
+    if not opened_directly:
+        feedback_link = wait.until(EC.element_to_be_clickable((By.LINK_TEXT, CONFIG['SELECTORS']['feedback_link_text'])))
+        yield from run.stage("open_feedback", "On dashboard. Clicking 'FEEDBACK' link...\n")
+        with portal_limiter.request():
+            feedback_link.click()
+            frame_stage = run.stage("switch_frame", "Switching to the feedback iframe...\n")
             wait.until(EC.frame_to_be_available_and_switch_to_it((By.NAME, CONFIG['SELECTORS']['iframe_name'])))
+        yield from frame_stage
 
-            yield "Checking for active feedback sessions...\n"
-            term_dropdown = Select(wait.until(EC.presence_of_element_located((By.ID, CONFIG['SELECTORS']['term_dropdown_id']))))
-            
-            valid_options = [opt for opt in term_dropdown.options if opt.get_attribute('value') and opt.get_attribute('value') != '0']
-
-            if not valid_options:
-                yield "🟡 No active feedback sessions found. Exiting."
-                return
-
-            available_values = [opt.get_attribute('value') for opt in valid_options]
-            yield f"✅ Active session(s) found. Available terms: {available_values}\n"
-
-            term_to_select = CONFIG['TERM_VALUE_TO_SELECT']
-            if term_to_select in available_values:
-                yield f"Selecting configured term: '{term_to_select}'\n"
-                term_dropdown.select_by_value(term_to_select)
-            else:
-                yield f"❌ Error: Your configured term '{term_to_select}' is not available.\n"
-                return
-
-            yield "Waiting for questions to appear...\n"
-            wait.until(EC.presence_of_element_located((By.XPATH, CONFIG['SELECTORS']['question_rows_xpath'])))
-            
-            question_rows = driver.find_elements(By.XPATH, CONFIG['SELECTORS']['question_rows_xpath'])
-            yield f"Found {len(question_rows)} questions. Filling feedback...\n"
-
-            for i, row in enumerate(question_rows, 1):
-                rating_value = CONFIG['RATINGS']['default']
-                radio_button = row.find_element(By.XPATH, f".//input[@type='radio' and @value='{rating_value}']")
-                driver.execute_script("arguments[0].click();", radio_button)
-                yield f"  - Question {i}: Answered with rating '{rating_value}'\n"
-                time.sleep(0.05)
-
-            yield "\nAll questions have been filled.\n"
-            if CONFIG.get("SUBMIT_FORM", False):
-                yield "Attempting to submit form...\n"
-                driver.find_element(By.ID, CONFIG['SELECTORS']['submit_button_id']).click()
-                yield "✅ FORM SUBMITTED SUCCESSFULLY!\n"
-            else:
-                yield "👍 Feedback filled. Submission is disabled in config.\n"
-            
-            yield "Automation finished successfully."
-            time.sleep(2)
+    yield from run.stage("find_terms", "Checking for active feedback sessions...\n")
+    term_element = wait.until(EC.presence_of_element_located((By.ID, CONFIG['SELECTORS']['term_dropdown_id'])))
+    term_dropdown = Select(term_element)
+    if not opened_directly:
+        # The frame now shows the feedback page itself; later runs can go straight there.
+        portal_links.remember_feedback_page_url(driver.execute_script("return document.location.href;"))
 
-        except TimeoutException as e:
-            yield f"\n❌ A timeout occurred. The page took too long to load an element.\nError details: {e}"
-        except Exception as e:
-            yield f"\n❌ An unexpected error occurred: {e}"
+    available_values = [opt['value'] for opt in read_select_options(driver, term_element) if opt['value'] and opt['value'] != '0']
+
+    if not available_values:
+        return "no_session", "🟡 No active feedback sessions found. Exiting."
+
+    yield progress_events.log(f"✅ Active session(s) found. Available terms: {available_values}\n", terms=available_values)
+
+    term_to_select = CONFIG['TERM_VALUE_TO_SELECT']
+    if term_to_select not in available_values:
+        return "term_unavailable", f"❌ Error: Your configured term '{term_to_select}' is not available.\n"
+
+    yield from run.stage("select_term", f"Selecting configured term: '{term_to_select}'\n")
+    with portal_limiter.request():
+        term_dropdown.select_by_value(term_to_select)
+        questions_stage = run.stage("wait_questions", "Waiting for questions to appear...\n")
+        wait.until(EC.presence_of_element_located((By.XPATH, CONFIG['SELECTORS']['question_rows_xpath'])))
+    yield from questions_stage
+    
+    yield from run.stage("fill")
+    ratings = CONFIG['RATINGS']
+    overrides = {question: rating for question, rating in ratings.items() if question != 'default'}
+    results = fill_ratings(driver, CONFIG['SELECTORS']['question_rows_xpath'], ratings['default'], overrides)
+    yield progress_events.log(f"Found {len(results)} questions. Filling feedback...\n", questions=len(results))
+
+    for result in results:
+        if not result['answered']:
+            raise RuntimeError(f"Question {result['question']} has no option with rating '{result['rating']}'.")
+        yield progress_events.question_filled(result['question'], result['rating'])
+
+    yield progress_events.log("\nAll questions have been filled.\n")
+    if CONFIG.get("SUBMIT_FORM", False):
+        yield from run.stage("submit", "Attempting to submit form...\n")
+        with portal_limiter.request():
+            driver.find_element(By.ID, CONFIG['SELECTORS']['submit_button_id']).click()
+        yield progress_events.log("✅ FORM SUBMITTED SUCCESSFULLY!\n")
+        # Give the submit postback time to reach the portal before Chrome is closed.
+        time.sleep(2)
+    else:
+        yield progress_events.log("👍 Feedback filled. Submission is disabled in config.\n")
 
+    return "success", "Automation finished successfully."
@@ -0,0 +1,143 @@
+"""
+Runs the feedback automation for one GRIET account from the command line, without the web app.
+
+Usage:
+    GRIET_USERNAME=21241A0501 GRIET_PASSWORD=... python feedback_cli.py --engine http --submit
+    printf '%s\\n' "$PASSWORD" | python feedback_cli.py --username 21241A0501 --password-stdin
+    python feedback_cli.py --credentials-file account.json --rating 5 --rating-for 3=4
+
+The password is read from GRIET_PASSWORD, from the first line of stdin (--password-stdin) or
+from a credentials file, never from the command line, where other users could see it.
+A credentials file is JSON ({"username": ..., "password": ...}) or two lines: username, then password.
+
+Exit status by outcome:
+    0 success, 3 no_session, 4 term_unavailable, 5 invalid_credentials, 6 portal_error
+    or portal_failure, 7 timeout, 8 portal_unavailable, 1 error, 130 aborted (Ctrl-C), 2 bad arguments.
+"""
+import argparse
+import json
+import os
+import sys
+
+import progress_events
+from automator_config import CONFIG
+
+# Only the chosen engine is imported, when the run starts (see engines.py): with --engine http,
+# Selenium is never loaded.
+EXIT_CODES = {
+    "success": 0,
+    "error": 1,
+    "no_session": 3,
+    "term_unavailable": 4,
+    "invalid_credentials": 5,
+    "portal_error": 6,
+    "portal_failure": 6,
+    "timeout": 7,
+    "portal_unavailable": 8,
+    "aborted": 130,
+}
+
+
+def _rating_override(text):
+    question, _, rating = text.partition("=")
+    if not question.isdigit() or not rating:
+        raise argparse.ArgumentTypeError(f"expected QUESTION=RATING, got '{text}'")
+    return int(question), rating
+
+
+def _read_credentials_file(path):
+    with open(path, encoding="utf-8-sig") as f:
+        text = f.read()
+    if text.lstrip().startswith("{"):
+        data = json.loads(text)
+        return data.get("username"), data.get("password")
+    lines = text.splitlines() + ["", ""]
+    return lines[0].strip(), lines[1]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    credentials = parser.add_argument_group("credentials")
+    credentials.add_argument("--username", default=os.environ.get("GRIET_USERNAME"), help="default: $GRIET_USERNAME")
+    credentials.add_argument("--password-stdin", action="store_true", help="read the password from the first line of stdin")
+    credentials.add_argument("--credentials-file", help="JSON or two-line file with the username and password")
+
+    run = parser.add_argument_group("run")
+    run.add_argument("--engine", choices=("selenium", "http"), default=CONFIG["ENGINE"])
+    run.add_argument("--login-url", default=CONFIG["LOGIN_URL"])
+    run.add_argument("--term", default=CONFIG["TERM_VALUE_TO_SELECT"], help="value of the term to select")
+    run.add_argument("--rating", default=CONFIG["RATINGS"]["default"], help="rating for every question")
+    run.add_argument("--rating-for", type=_rating_override, action="append", default=[], metavar="QUESTION=RATING",
+                     help="rating for one question (1-based), repeatable")
+    run.add_argument("--submit", action=argparse.BooleanOptionalAction, default=CONFIG["SUBMIT_FORM"],
+                     help="submit the filled form (default: %(default)s)")
+    run.add_argument("--deep-link", action=argparse.BooleanOptionalAction, default=CONFIG["DEEP_LINK"],
+                     help="open the feedback page at its cached URL (default: %(default)s)")
+    run.add_argument("--page-timeout", type=float, default=CONFIG["PAGE_TIMEOUT"],
+                     help="seconds the browser waits for a page element (default: %(default)s)")
+    run.add_argument("--http-timeout", type=float, default=CONFIG["HTTP_TIMEOUT"],
+                     help="seconds the HTTP engine waits for a response (default: %(default)s)")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--format", choices=("text", "ndjson"), default="text", help="how events are printed")
+    output.add_argument("--quiet", action="store_true", help="print only the outcome")
+    return parser
+
+
+def apply_config(args):
+    """Copies the command-line settings into CONFIG, which every engine reads."""
+    CONFIG["ENGINE"] = args.engine
+    CONFIG["LOGIN_URL"] = args.login_url
+    CONFIG["TERM_VALUE_TO_SELECT"] = args.term
+    CONFIG["RATINGS"] = {"default": args.rating, **{question: rating for question, rating in args.rating_for}}
+    CONFIG["SUBMIT_FORM"] = args.submit
+    CONFIG["DEEP_LINK"] = args.deep_link
+    CONFIG["PAGE_TIMEOUT"] = args.page_timeout
+    CONFIG["HTTP_TIMEOUT"] = args.http_timeout
+
+
+def read_credentials(args, parser):
+    username, password = args.username, os.environ.get("GRIET_PASSWORD")
+    if args.credentials_file:
+        try:
+            file_username, password = _read_credentials_file(args.credentials_file)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read {args.credentials_file}: {e}")
+        username = args.username or file_username
+    if args.password_stdin:
+        password = sys.stdin.readline().rstrip("\r\n")
+    if not username or not password:
+        parser.error("a GRIET username and password are required (see --help)")
+    return username, password
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    username, password = read_credentials(args, parser)
+    apply_config(args)
+
+    from engines import run_automation
+
+    render = progress_events.render_text if args.format == "text" else progress_events.to_ndjson
+    final = None
+    run = run_automation(username, password, engine=args.engine)
+    try:
+        for event in run:
+            if event["type"] == "outcome":
+                final = event
+            if not args.quiet or final is not None:
+                sys.stdout.write(render(event))
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        run.close()  # Quits the browser before exiting.
+        final = progress_events.outcome("aborted", "\n⛔ Run aborted.\n")
+        sys.stdout.write(render(final))
+    except Exception as e:
+        final = progress_events.outcome("error", f"\n--- A critical error occurred ---\nError details: {e}\n")
+        sys.stdout.write(render(final))
+    return EXIT_CODES.get(final["outcome"] if final else "error", 1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import portal_limiter
+import portal_links
+import progress_events
+import session_cache
+from automator_config import CONFIG
+from portal_errors import InvalidCredentialsError, PortalErrorPage, PortalFailure
+
+# Every run gets its own Session (and so its own cookie jar), but they all share one
+# connection pool so keep-alive connections to the portal are reused across runs.
+_shared_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+
+
+class PortalParseError(Exception):
+    """Raised when a portal page does not look the way the HTTP engine expects."""
+
+
+class _PortalPage(HTMLParser):
+    """Extracts the WebForms state the HTTP engine needs from one HTML page."""
+
+    def __init__(self, url, html):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.form_action = None
+        self.fields = {}        # name -> value, as the browser would post them
+        self.inputs_by_id = {}  # id -> attribute dict
+        self.selects = {}       # id -> {"name": ..., "options": [(value, text)]}
+        self.links = []         # (text, href)
+        self.frames = {}        # name -> src
+        self.radio_groups = {}  # name -> [values], radios inside the feedback table only
+        self.text = []          # visible text fragments
+        self._select = None
+        self._option = None
+        self._link = None
+        self._feedback_table_depth = 0
+        self._table_depth = 0
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {key: (value if value is not None else "") for key, value in attrs}
+        if tag == "form" and self.form_action is None:
+            self.form_action = urljoin(self.url, attrs.get("action", "") or self.url)
+        elif tag == "table":
+            self._table_depth += 1
+            if not self._feedback_table_depth and "gvStudentFeedback" in attrs.get("id", ""):
+                self._feedback_table_depth = self._table_depth
+        elif tag == "input":
+            self._handle_input(attrs)
+        elif tag == "select":
+            self._select = {"name": attrs.get("name", ""), "options": [], "selected": None}
+            self.selects[attrs.get("id", attrs.get("name", ""))] = self._select
+        elif tag == "option" and self._select is not None:
+            self._option = [attrs.get("value"), ""]
+            if "selected" in attrs:
+                self._select["selected"] = attrs.get("value")
+        elif tag == "a":
+            self._link = [attrs.get("href", ""), ""]
+        elif tag in ("iframe", "frame"):
+            self.frames[attrs.get("name") or attrs.get("id", "")] = urljoin(self.url, attrs.get("src", ""))
+
+    def _handle_input(self, attrs):
+        if "id" in attrs:
+            self.inputs_by_id[attrs["id"]] = attrs
+        name, input_type = attrs.get("name"), attrs.get("type", "text").lower()
+        if not name:
+            return
+        if input_type in ("hidden", "text", "password"):
+            self.fields[name] = attrs.get("value", "")
+        elif input_type in ("radio", "checkbox"):
+            if self._feedback_table_depth and input_type == "radio":
+                self.radio_groups.setdefault(name, []).append(attrs.get("value", ""))
+            if "checked" in attrs:
+                self.fields[name] = attrs.get("value", "on")
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            if self._feedback_table_depth == self._table_depth:
+                self._feedback_table_depth = 0
+            self._table_depth -= 1
+        elif tag == "option" and self._option is not None:
+            value, text = self._option
+            self._select["options"].append((text.strip() if value is None else value, text.strip()))
+            self._option = None
+        elif tag == "select" and self._select is not None:
+            options = self._select["options"]
+            selected = self._select["selected"]
+            if selected is None and options:
+                selected = options[0][0]
+            if self._select["name"] and selected is not None:
+                self.fields[self._select["name"]] = selected
+            self._select = None
+        elif tag == "a" and self._link is not None:
+            self.links.append((self._link[1].strip(), self._link[0]))
+            self._link = None
+
+    def handle_data(self, data):
+        if data.strip():
+            self.text.append(data.strip())
+        if self._option is not None:
+            self._option[1] += data
+        if self._link is not None:
+            self._link[1] += data
+
+    def find_text(self, needles):
+        """Returns the first text fragment containing any of `needles` (case-insensitive)."""
+        for fragment in self.text:
+            if any(needle.lower() in fragment.lower() for needle in needles):
+                return fragment
+        return None
+
+    def input_name(self, element_id):
+        """Returns the form field name of the input with the given id."""
+        attrs = self.inputs_by_id.get(element_id)
+        if not attrs or not attrs.get("name"):
+            raise PortalParseError(f"Input '{element_id}' was not found on {self.url}")
+        return attrs["name"]
+
+
+class PortalClient:
+    """A thin WebForms client: GETs pages and replays postbacks with their hidden state."""
+
+    def __init__(self, timeout):
+        self.session = requests.Session()
+        self.session.mount("http://", _shared_adapter)
+        self.session.mount("https://", _shared_adapter)
+        self.timeout = timeout
+        self.requests_sent = 0
+
+    def get(self, url):
+        self.requests_sent += 1
+        with portal_limiter.request():
+            return self._page(self.session.get(url, timeout=self.timeout))
+
+    def postback(self, page, extra_fields):
+        if not page.form_action:
+            raise PortalParseError(f"No form found on {page.url}")
+        data = dict(page.fields)
+        data.update(extra_fields)
+        self.requests_sent += 1
+        with portal_limiter.request():
+            return self._page(self.session.post(page.form_action, data=data, timeout=self.timeout))
+
+    @staticmethod
+    def _page(response):
+        if response.status_code >= 400:
+            raise PortalErrorPage(f"HTTP {response.status_code} from {response.url}")
+        return _PortalPage(response.url, response.text)
+
+    def cookies(self):
+        """Returns the session cookies in the shape Selenium's get_cookies() uses."""
+        return [{
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+            "secure": bool(cookie.secure),
+            "httpOnly": cookie.has_nonstandard_attr("HttpOnly"),
+        } for cookie in self.session.cookies]
+
+    def set_cookies(self, cookies):
+        for cookie in cookies:
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""),
+                                     path=cookie.get("path", "/"), secure=cookie.get("secure", False))
+
+    def close(self):
+        # Session.close() would close the shared adapter too, emptying the keep-alive pool of
+        # every run. Dropping the cookies is all the cleanup a run's session needs.
+        self.session.cookies.clear()
+
+
+def run_feedback_automation_http(username, password, run=None):
+    """
+    Runs the GRIET feedback automation with plain HTTP form posts instead of a browser.
+
+    Yields the same progress events as the Selenium engine, ending with the outcome. Raises
+    PortalParseError (before any outcome) when a page does not match what the engine
+    expects, so the caller can fall back to Selenium with the same RunTracker.
+    """
+    run = run or progress_events.RunTracker()
+    yield from run.stage("startup", "Initializing automation (HTTP engine)...\n")
+    client = PortalClient(CONFIG["HTTP_TIMEOUT"])
+    try:
+        outcome, message = yield from _http_steps(client, username, password, run)
+    except PortalParseError:
+        raise
+    except PortalFailure as e:
+        outcome, message = e.outcome, e.log_line()
+    except requests.Timeout as e:
+        outcome, message = "timeout", f"\n❌ A timeout occurred. The portal took too long to answer.\nError details: {e}"
+    except Exception as e:
+        outcome, message = "error", f"\n❌ An unexpected error occurred: {e}"
+    finally:
+        client.close()
+
+    yield from run.outcome(outcome, message, http_requests=client.requests_sent)
+
+
+def _resume_session(client, username, password, run):
+    """Restores a saved portal session and fetches the dashboard with it. Returns the dashboard or None."""
+    saved = session_cache.load(username, password)
+    if saved is None:
+        return None
+    yield from run.stage("resume_session", "Reusing the saved portal session...\n")
+    client.set_cookies(saved["cookies"])
+    try:
+        dashboard = client.get(saved["dashboard_url"])
+    except PortalErrorPage:
+        dashboard = None
+    selectors = CONFIG["SELECTORS"]
+    if (dashboard is not None and portal_links.same_page(saved["dashboard_url"], dashboard.url)
+            and selectors["username_field_id"] not in dashboard.inputs_by_id
+            and any(text == selectors["feedback_link_text"] for text, _ in dashboard.links)):
+        yield progress_events.log("✅ Saved session is still valid. Skipping the login form.\n")
+        return dashboard
+    session_cache.rejected(username)
+    client.session.cookies.clear()
+    yield progress_events.warning("⚠️ The saved session has expired. Logging in again...\n")
+    return None
+
+
+def _open_feedback_directly(client, run):
+    """Fetches the cached feedback page URL. Returns the page, or None to take the FEEDBACK link."""
+    deep_link = portal_links.feedback_page_url()
+    if not deep_link:
+        return None
+    yield from run.stage("open_feedback", "On dashboard. Opening the feedback page directly...\n")
+    try:
+        page = client.get(deep_link)
+    except PortalErrorPage:
+        page = None  # A stale link can 404; the click path will tell whether the portal is really down.
+    if page is not None and portal_links.same_page(deep_link, page.url) and CONFIG["SELECTORS"]["term_dropdown_id"] in page.selects:
+        return page
+    portal_links.forget_feedback_page_url()
+    yield progress_events.warning("⚠️ The direct link to the feedback page was redirected. Using the FEEDBACK link instead...\n")
+    return None
+
+
+def _http_steps(client, username, password, run):
+    """Replays the portal's postbacks, yielding progress events. Returns (outcome, message)."""
+    selectors = CONFIG["SELECTORS"]
+
+    dashboard = yield from _resume_session(client, username, password, run)
+    if dashboard is None:
+        yield from run.stage("open_login", "Navigating to login page...\n")
+        login_page = client.get(CONFIG["LOGIN_URL"])
+
+        yield from run.stage("login", "Login submitted. Waiting for dashboard...\n")
+        login_button = login_page.input_name(selectors["login_button_id"])
+        with portal_limiter.login_slot():
+            dashboard = client.postback(login_page, {
+                login_page.input_name(selectors["username_field_id"]): username,
+                login_page.input_name(selectors["password_field_id"]): password,
+                # An <input type="image"> posts the click coordinates instead of a value.
+                f"{login_button}.x": "10",
+                f"{login_button}.y": "10",
+            })
+        if selectors["username_field_id"] in dashboard.inputs_by_id:
+            raise InvalidCredentialsError(
+                dashboard.find_text(CONFIG["LOGIN_ERROR_TEXTS"]) or "The portal sent us back to the login page."
+            )
+        session_cache.store(username, password, client.cookies(), dashboard.url)
+
+    feedback_page = yield from _open_feedback_directly(client, run)
+    if feedback_page is None:
+        feedback_href = next((href for text, href in dashboard.links if text == selectors["feedback_link_text"]), None)
+        if not feedback_href or feedback_href.lower().startswith("javascript:"):
+            raise PortalParseError("FEEDBACK link with a plain URL was not found on the dashboard")
+        yield from run.stage("open_feedback", "On dashboard. Opening the 'FEEDBACK' page...\n")
+        feedback_page = client.get(urljoin(dashboard.url, feedback_href))
+
+        frame_src = feedback_page.frames.get(selectors["iframe_name"])
+        if frame_src:
+            yield from run.stage("switch_frame", "Loading the feedback frame...\n")
+            feedback_page = client.get(frame_src)
+
+    yield from run.stage("find_terms", "Checking for active feedback sessions...\n")
+    term_dropdown = feedback_page.selects.get(selectors["term_dropdown_id"])
+    if term_dropdown is None:
+        raise PortalParseError("Term dropdown was not found on the feedback page")
+    portal_links.remember_feedback_page_url(feedback_page.url)
+
+    available_values = [value for value, _ in term_dropdown["options"] if value and value != "0"]
+    if not available_values:
+        return "no_session", "🟡 No active feedback sessions found. Exiting."
+    yield progress_events.log(f"✅ Active session(s) found. Available terms: {available_values}\n", terms=available_values)
+
+    term_to_select = CONFIG["TERM_VALUE_TO_SELECT"]
+    if term_to_select not in available_values:
+        return "term_unavailable", f"❌ Error: Your configured term '{term_to_select}' is not available.\n"
+    yield from run.stage("select_term", f"Selecting configured term: '{term_to_select}'\n")
+    # The dropdown has AutoPostBack, so selecting a term is a postback targeting it.
+    question_page = client.postback(feedback_page, {
+        "__EVENTTARGET": term_dropdown["name"],
+        "__EVENTARGUMENT": "",
+        term_dropdown["name"]: term_to_select,
+    })
+
+    yield from run.stage("wait_questions", "Waiting for questions to appear...\n")
+    if not question_page.radio_groups:
+        raise PortalParseError("No question radio groups were found in the feedback table")
+
+    yield from run.stage("fill")
+    ratings = CONFIG["RATINGS"]
+    answers = {}
+    for i, (group, values) in enumerate(question_page.radio_groups.items(), 1):
+        rating_value = str(ratings.get(i, ratings.get(str(i), ratings["default"])))
+        if rating_value not in values:
+            raise PortalParseError(f"Question {i} has no option with value '{rating_value}'")
+        answers[group] = rating_value
+    yield progress_events.log(f"Found {len(answers)} questions. Filling feedback...\n", questions=len(answers))
+    for i, rating_value in enumerate(answers.values(), 1):
+        yield progress_events.question_filled(i, rating_value)
+
+    yield progress_events.log("\nAll questions have been filled.\n")
+    if CONFIG.get("SUBMIT_FORM", False):
+        yield from run.stage("submit", "Attempting to submit form...\n")
+        submit_name = question_page.input_name(selectors["submit_button_id"])
+        submit_value = question_page.inputs_by_id[selectors["submit_button_id"]].get("value", "")
+        client.postback(question_page, {**answers, "__EVENTTARGET": "", "__EVENTARGUMENT": "", submit_name: submit_value})
+        yield progress_events.log("✅ FORM SUBMITTED SUCCESSFULLY!\n")
+    else:
+        yield progress_events.log("👍 Feedback filled. Submission is disabled in config.\n")
+
+    return "success", "Automation finished successfully."
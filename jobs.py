@@ -0,0 +1,349 @@
+import collections
+import concurrent.futures
+import math
+import threading
+import time
+import uuid
+
+import progress_events
+from run_timings import run_timings
+
+
+class QueueFull(Exception):
+    """The job queue is full. `retry_after` is an estimate, in seconds, of when a place frees up."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many runs are waiting. Try again in {retry_after} s.")
+        self.retry_after = retry_after
+
+
+class Job:
+    """
+    One automation run: its status, its recent progress events and, once it ends, its result.
+
+    Events are kept in a bounded buffer. Each one gets the next event ID, so a client that
+    reconnects can resume right after the last event it received. The automation thread never
+    waits for clients: when the buffer is full, runs of verbose events are coalesced first,
+    then the oldest verbose event is dropped, and only then the oldest event of any type.
+
+    A job that was followed by a client and then lost all of its followers counts as abandoned,
+    so the manager can cancel it instead of keeping a browser busy for nobody.
+    """
+
+    def __init__(self, owner, username, engine, log_size=1000):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.username = username
+        self.engine = engine
+        self.status = "queued"  # queued -> running -> finished | crashed | cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = collections.deque(maxlen=log_size)  # (event_id, event)
+        self.last_event_id = 0
+        self.dropped_through = 0  # highest event ID no longer in the buffer
+        self.coalesced = 0
+        self.result = None
+        self._outcome = None
+        self.followers = 0
+        self._followed = False
+        self._unfollowed_at = None
+        self.cancel_reason = None  # "disconnect" or "request"
+        self.cancel_message = None
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("finished", "crashed", "cancelled")
+
+    @property
+    def outcome_event(self):
+        """The run's outcome event once it has one, with every field the engine attached to it."""
+        return self._outcome
+
+    def cancel(self, reason, message):
+        """Asks the job to stop. The run checks this between progress events."""
+        with self._cond:
+            if self.cancel_reason is None:
+                self.cancel_reason, self.cancel_message = reason, message
+
+    def abandoned(self, grace):
+        """Returns whether every client that followed this job has been gone for `grace` seconds."""
+        with self._cond:
+            return (grace > 0 and self._followed and self.followers == 0
+                    and time.monotonic() - self._unfollowed_at >= grace)
+
+    def append(self, event):
+        with self._cond:
+            if len(self.events) == self.events.maxlen:
+                self._make_room()
+            self.last_event_id += 1
+            self.events.append((self.last_event_id, event))
+            if event["type"] == "outcome":
+                self._outcome = event
+            self._cond.notify_all()
+            return self.last_event_id
+
+    def _make_room(self):
+        events = list(self.events)
+        merged = []
+        run = []
+        for entry in events + [None]:
+            if entry is not None and entry[1]["type"] in progress_events.VERBOSE_TYPES:
+                run.append(entry)
+                continue
+            if len(run) > 1:
+                # Under the run's first ID: a follower already past it has seen some of these
+                # questions and skips the merged line rather than getting them twice.
+                merged.append((run[0][0], progress_events.coalesce_questions([event for _, event in run])))
+                self.coalesced += len(run) - 1
+            else:
+                merged.extend(run)
+            run = []
+            if entry is not None:
+                merged.append(entry)
+
+        if len(merged) == len(events):
+            verbose = next((i for i, (_, event) in enumerate(merged) if event["type"] in progress_events.VERBOSE_TYPES), 0)
+            merged.pop(verbose)
+            # Only the oldest entry leaves a hole a follower can notice; later ones are just skipped.
+            # A merged entry covers every ID up to the next entry's.
+            if verbose == 0:
+                self.dropped_through = merged[0][0] - 1 if merged else self.last_event_id
+        self.events = collections.deque(merged, maxlen=self.events.maxlen)
+
+    def finish(self, status):
+        with self._cond:
+            self.status = status
+            self.finished_at = time.time()
+            outcome = self._outcome or progress_events.outcome("error", "The run ended without an outcome.")
+            self.result = {
+                "succeeded": status == "finished" and outcome["ok"],
+                "outcome": outcome["outcome"],
+                "message": outcome["message"].strip(),
+                "duration": self.finished_at - (self.started_at or self.created_at),
+                "stages": outcome.get("stages", {}),
+            }
+            self._cond.notify_all()
+
+    def log_text(self):
+        with self._cond:
+            return "".join(progress_events.render_text(event) for _, event in self.events)
+
+    def follow(self, after=0, heartbeat=None):
+        """
+        Yields (event_id, event) for every event after ID `after`, waiting for new ones until
+        the job ends. If the oldest events were already dropped from the buffer, a warning
+        takes their place. With `heartbeat` set, yields None after that many idle seconds.
+        """
+        with self._cond:
+            self.followers += 1
+            self._followed = True
+        try:
+            yield from self._follow(after, heartbeat)
+        finally:
+            # Runs when the response generator is closed, which is how a dropped client shows up.
+            with self._cond:
+                self.followers -= 1
+                self._unfollowed_at = time.monotonic()
+
+    def _follow(self, after, heartbeat):
+        position = after
+        while True:
+            with self._cond:
+                if self.last_event_id <= position and not self.done:
+                    self._cond.wait(heartbeat or 15)
+                events = [event for event in self.events if event[0] > position]
+                dropped_through = self.dropped_through
+                done = self.done
+            if position < dropped_through:
+                missed = dropped_through - position
+                yield dropped_through, progress_events.warning(f"[... {missed} earlier log lines are no longer available ...]\n")
+                position = dropped_through
+            for event in events:
+                yield event
+            if events:
+                position = events[-1][0]
+            elif heartbeat and not done:
+                yield None
+            if done and position >= self.last_event_id:
+                return
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "username": self.username,
+            "engine": self.engine,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "last_event_id": self.last_event_id,
+            "coalesced_events": self.coalesced,
+            "result": self.result,
+        }
+
+
+class JobManager:
+    """
+    Runs automations on a bounded thread pool, independent of the HTTP request that asked for them.
+
+    `runner(username, password, engine)` must return a generator of progress events. Finished
+    jobs are kept in memory until `max_finished` newer ones have completed, each with at most
+    `log_size` events. `on_change(job)`, if given, is called whenever a job is queued, starts
+    or ends.
+
+    A job whose followers all disconnected more than `disconnect_grace` seconds ago is
+    cancelled cooperatively: the run's generator is closed between two events, which quits
+    (or returns to the pool) its Chrome and frees the worker slot.
+
+    At most `max_queued` jobs wait for a thread; submitting another one raises QueueFull
+    instead of letting the backlog, and the browsers it will start, grow without bound.
+
+    With `shared` (a shared_jobs.SharedJobs), jobs are mirrored to the shared store so other
+    gunicorn workers can follow and cancel them, and only one job per GRIET account runs at a
+    time across all workers: submitting another one attaches to the job already in flight.
+    """
+
+    # Assumed run duration for Retry-After estimates until this process has timed a run.
+    DEFAULT_RUN_SECONDS = 30
+
+    def __init__(self, runner, max_workers=2, max_finished=200, log_size=1000, on_change=None,
+                 disconnect_grace=10, shared=None, max_queued=None):
+        self._runner = runner
+        self.max_queued = max_queued
+        self._shared = shared
+        self.disconnect_grace = disconnect_grace
+        self._on_change = on_change
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="automation-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._finished = collections.deque()
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.log_size = log_size
+
+    def submit(self, owner, username, password, engine):
+        """
+        Queues a run and returns (job, attached). `attached` is True when a run for the same
+        account was already in flight and `job` is that run rather than a new one. Raises
+        shared_jobs.AccountBusy if that run was started with a different password, and
+        QueueFull if `max_queued` jobs are already waiting.
+        """
+        job = Job(owner, username, engine, self.log_size)
+        if self._shared is not None:
+            running = self._shared.claim(username, password, job)
+            if running is not None:
+                return self.get(running), True
+        with self._lock:
+            admitted = self.max_queued is None or sum(other.status == "queued" for other in self._jobs.values()) < self.max_queued
+            if admitted:
+                self._jobs[job.id] = job
+        if not admitted:
+            if self._shared is not None:
+                self._publish(self._shared.discard, username, job.id)
+            raise QueueFull(self.retry_after())
+        # The password only lives in this closure, never on the Job itself.
+        self._executor.submit(self._run, job, password)
+        self._notify(job)
+        return job, False
+
+    def retry_after(self):
+        """Estimates, from recent run durations, how many seconds pass until a queued job starts."""
+        typical = run_timings.stats()["duration"]["p50"] or self.DEFAULT_RUN_SECONDS
+        now = time.time()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        running = [now - job.started_at for job in jobs if job.status == "running" and job.started_at]
+        queued = sum(job.status == "queued" for job in jobs)
+        # The queue moves once the longest-running job ends; every job beyond `max_queued` waits for its share of runs more.
+        first = max(typical - max(running), 1) if running else typical
+        return max(1, math.ceil(first + typical * max(queued - (self.max_queued or 0), 0) / self.max_workers))
+
+    def get(self, job_id):
+        """Returns a job of this worker or, with a shared store, a RemoteJob of another worker."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self._shared is not None:
+            job = self._shared.get(job_id)
+        return job
+
+    def counts(self):
+        """Returns how many jobs are queued and running."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {
+            "queued": sum(job.status == "queued" for job in jobs),
+            "running": sum(job.status == "running" for job in jobs),
+            "cancelled": sum(job.status == "cancelled" for job in jobs),
+        }
+
+    def _should_stop(self, job):
+        if self._shared is not None and job.cancel_reason is None:
+            requested = self._shared.cancel_requested(job.id)
+            if requested is not None:
+                job.cancel(*requested)
+        if job.abandoned(self.disconnect_grace) and not (self._shared and self._shared.remote_followers(job.id)):
+            job.cancel("disconnect", "\n⛔ Run aborted: the client disconnected.")
+        return job.cancel_reason is not None
+
+    def _append(self, job, event):
+        event_id = job.append(event)
+        if self._shared is not None:
+            self._publish(self._shared.publish_event, job.id, event_id, event)
+
+    def _run(self, job, password):
+        job.status = "running"
+        job.started_at = time.time()
+        self._notify(job)
+        try:
+            if self._should_stop(job):
+                self._append(job, progress_events.outcome("aborted", job.cancel_message))
+                status = "cancelled"
+            else:
+                status = "finished"
+                run = self._runner(job.username, password, job.engine)
+                for event in run:
+                    self._append(job, event)
+                    if self._should_stop(job):
+                        run.close()  # GeneratorExit unwinds the engine, quitting its browser.
+                        self._append(job, progress_events.outcome("aborted", job.cancel_message))
+                        status = "cancelled"
+                        break
+        except Exception as e:
+            self._append(job, progress_events.outcome(
+                "error", f"\n--- A critical error occurred in the backend ---\nError details: {str(e)}"))
+            status = "crashed"
+        # The claim goes before finish() wakes the followers: a client that resubmits as soon as
+        # its stream ends must start a new run, not attach to this one.
+        if self._shared is not None:
+            self._publish(self._shared.release, job.username, job.id)
+        job.finish(status)
+        self._retire(job)
+        self._notify(job)
+
+    def _notify(self, job):
+        if self._shared is not None:
+            self._publish(self._shared.publish_status, job)
+        if self._on_change is None:
+            return
+        try:
+            self._on_change(job)
+        except Exception:
+            pass  # Bookkeeping such as metrics must never fail a run.
+
+    @staticmethod
+    def _publish(method, *args):
+        try:
+            method(*args)
+        except Exception:
+            pass  # A busy or broken shared store only costs other workers their view of the job.
+
+    def _retire(self, job):
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.popleft(), None)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,174 @@
+import collections
+import os
+
+import portal_health
+import portal_limiter
+import shared_store
+from chrome_procs import chrome_pids
+from progress_events import OUTCOMES
+
+# Prometheus metrics for the web app, aggregated across every gunicorn worker on the host.
+#
+# Counters and histogram buckets are rows in the shared SQLite store that each worker
+# increments in place, so any worker can answer a scrape with the totals. Gauges are kept
+# per worker pid and summed at scrape time, skipping workers that have exited.
+
+RUN_DURATION_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300)
+STAGE_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+RUN_OUTCOMES = OUTCOMES + ("crash",)
+
+METRICS = {
+    "griet_runs_total": ("counter", "Finished automation runs by outcome."),
+    "griet_runs_rejected_total": ("counter", "Run requests turned away with 429 because the job queue was full."),
+    "griet_runs_aborted_total": ("counter", "Runs cancelled before they ended, by reason (disconnect or request)."),
+    "griet_session_cache_total": ("counter", "Saved portal session lookups by result (hit, miss, stale, password_changed)."),
+    "griet_run_duration_seconds": ("histogram", "Wall-clock duration of finished automation runs."),
+    "griet_stage_duration_seconds": ("histogram", "Duration of each stage of an automation run."),
+    "griet_reaper_processes_killed_total": ("counter", "Orphaned Chrome and chromedriver processes killed by the reaper."),
+    "griet_reaper_profiles_removed_total": ("counter", "Orphaned Chrome profile folders deleted by the reaper."),
+    "griet_reaper_bytes_reclaimed_total": ("counter", "Disk space freed by deleting orphaned profile folders."),
+    "griet_portal_backoffs_total": ("counter", "Times the portal request rate was cut because the portal answered slowly or failed."),
+    "griet_portal_throttled_seconds_total": ("counter", "Time runs spent waiting for the portal rate limit."),
+    "griet_portal_breaker_opens_total": ("counter", "Times the portal circuit breaker opened."),
+    "griet_portal_breaker_rejected_total": ("counter", "Runs refused without starting a browser because the portal circuit breaker was open."),
+    "griet_runs_in_flight": ("gauge", "Automation runs currently executing."),
+    "griet_runs_queued": ("gauge", "Automation runs waiting for a job worker."),
+    "griet_runs_queue_capacity": ("gauge", "Most automation runs that may wait for a job worker."),
+    "griet_chrome_processes": ("gauge", "Chrome and chromedriver processes alive on this host."),
+    "griet_browser_pool_leased": ("gauge", "Browser sessions or contexts currently leased to a run."),
+    "griet_browser_pool_capacity": ("gauge", "Most browser sessions or contexts the workers can lease at once."),
+    "griet_browser_pool_utilization": ("gauge", "Leased browser sessions as a fraction of capacity."),
+    "griet_portal_request_rate": ("gauge", "Requests per second the portal rate limit currently allows."),
+    "griet_portal_logins_in_progress": ("gauge", "Logins to the portal in progress on this host."),
+    "griet_portal_breaker_state": ("gauge", "Portal circuit breaker state: 0 closed, 1 half-open, 2 open."),
+    "griet_portal_probe_up": ("gauge", "1 if the last health probe of the portal succeeded, else 0."),
+}
+
+shared_store.schema("""
+CREATE TABLE IF NOT EXISTS metric_counters (
+    name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+CREATE TABLE IF NOT EXISTS metric_gauges (
+    name TEXT NOT NULL, labels TEXT NOT NULL, pid INTEGER NOT NULL, value REAL NOT NULL,
+    PRIMARY KEY (name, labels, pid)
+);
+""")
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _histogram_rows(name, value, buckets, **labels):
+    """Returns the (name, labels, amount) increments that record one observation."""
+    rows = [(f"{name}_bucket", _labels(**labels, le=bucket), 1 if value <= bucket else 0) for bucket in buckets]
+    rows.append((f"{name}_bucket", _labels(**labels, le="+Inf"), 1))
+    rows.append((f"{name}_sum", _labels(**labels), value))
+    rows.append((f"{name}_count", _labels(**labels), 1))
+    return rows
+
+
+def _increment(rows):
+    with shared_store.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO metric_counters (name, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+            rows,
+        )
+
+
+def count(name, amount=1, **labels):
+    """Adds `amount` to a counter."""
+    _increment([(name, _labels(**labels), amount)])
+
+
+def set_gauges(values):
+    """Publishes this worker's current value for each gauge in `values` ({name: value})."""
+    with shared_store.transaction() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO metric_gauges (name, labels, pid, value) VALUES (?, '', ?, ?)",
+            [(name, os.getpid(), value) for name, value in values.items()],
+        )
+
+
+def record_run(job):
+    """Counts a finished job by outcome and records its total and per-stage durations."""
+    outcome = "crash" if job.status == "crashed" else job.result["outcome"]
+    rows = [("griet_runs_total", _labels(outcome=outcome), 1)]
+    if job.status == "cancelled":
+        rows.append(("griet_runs_aborted_total", _labels(reason=job.cancel_reason), 1))
+    rows += _histogram_rows("griet_run_duration_seconds", job.result["duration"], RUN_DURATION_BUCKETS)
+    for stage, duration in (job.result.get("stages") or {}).items():
+        rows += _histogram_rows("griet_stage_duration_seconds", duration, STAGE_DURATION_BUCKETS, stage=stage)
+    _increment(rows)
+
+
+def record_reap(report):
+    """Adds one reaper pass (see chrome_reaper.py) to the reaper counters."""
+    _increment([(f"griet_reaper_{key}_total", "", value) for key, value in report.items()])
+
+
+def _bucket_order(row):
+    labels = row[0]
+    le = labels[labels.rfind('le="') + 4:-1]
+    return labels[:labels.rfind("le=")], float("inf") if le == "+Inf" else float(le)
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    conn = shared_store.connect()
+    counters = collections.defaultdict(list)
+    for name, labels, value in conn.execute("SELECT name, labels, value FROM metric_counters"):
+        counters[name].append((labels, value))
+
+    gauges = collections.defaultdict(float)
+    dead = set()
+    for name, labels, pid, value in conn.execute("SELECT name, labels, pid, value FROM metric_gauges"):
+        if pid in dead or not shared_store.pid_alive(pid):
+            dead.add(pid)
+            continue
+        gauges[name] += value
+    if dead:
+        with shared_store.transaction() as conn:
+            conn.executemany("DELETE FROM metric_gauges WHERE pid = ?", [(pid,) for pid in dead])
+
+    gauges["griet_chrome_processes"] = len(chrome_pids())
+    limiter = portal_limiter.stats()
+    gauges["griet_portal_request_rate"] = limiter["rate"]
+    gauges["griet_portal_logins_in_progress"] = limiter["logins_in_progress"]
+    counters["griet_portal_backoffs_total"] = [("", limiter["backoffs"])]
+    counters["griet_portal_throttled_seconds_total"] = [("", limiter["throttled_seconds"])]
+    breaker = portal_health.stats()
+    gauges["griet_portal_breaker_state"] = portal_health.STATES.index(breaker["state"])
+    gauges["griet_portal_probe_up"] = int(breaker["probe_ok"])
+    counters["griet_portal_breaker_opens_total"] = [("", breaker["opens"])]
+    counters["griet_portal_breaker_rejected_total"] = [("", breaker["rejected"])]
+    capacity = gauges.get("griet_browser_pool_capacity", 0)
+    gauges["griet_browser_pool_utilization"] = gauges.get("griet_browser_pool_leased", 0) / capacity if capacity else 0.0
+
+    # Known label values are reported as 0 before they first happen, so rate() works from the start.
+    for name, label, values in (("griet_runs_total", "outcome", RUN_OUTCOMES),
+                                ("griet_runs_aborted_total", "reason", ("disconnect", "request")),
+                                ("griet_session_cache_total", "result", ("hit", "miss", "stale", "password_changed"))):
+        seen = {labels for labels, _ in counters[name]}
+        counters[name] += [(_labels(**{label: v}), 0) for v in values if _labels(**{label: v}) not in seen]
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            lines += [_sample(name, labels, value) for labels, value in sorted(counters[name])] or [_sample(name, "", 0)]
+        elif kind == "histogram":
+            lines += [_sample(f"{name}_bucket", labels, value) for labels, value in sorted(counters[f"{name}_bucket"], key=_bucket_order)]
+            lines += [_sample(f"{name}_sum", labels, value) for labels, value in sorted(counters[f"{name}_sum"])]
+            lines += [_sample(f"{name}_count", labels, value) for labels, value in sorted(counters[f"{name}_count"])]
+        else:
+            lines.append(_sample(name, "", gauges.get(name, 0)))
+    return "\n".join(lines) + "\n"
+
+
+def _sample(name, labels, value):
+    value = int(value) if float(value).is_integer() else value
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
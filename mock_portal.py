@@ -0,0 +1,207 @@
+"""
+A local stand-in for the GRIET webprosindia portal, for offline testing and benchmarking.
+
+It reproduces the pages and element IDs the automator relies on: the login form (txtId2,
+txtPwd2, imgBtn2), the dashboard FEEDBACK link, the capIframe frame, the term dropdown and
+the gvStudentFeedback radio table. Point the automator at it with:
+
+    python mock_portal.py --port 8000 --questions 40 --latency 0.2
+    GRIET_LOGIN_URL=http://127.0.0.1:8000/Gokaraju/ flask run
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import time
+
+from flask import Flask, abort, redirect, request, session, url_for
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>{title}</title>
+<script>
+function __doPostBack(target, argument) {{
+    var form = document.forms[0];
+    form.__EVENTTARGET.value = target;
+    form.__EVENTARGUMENT.value = argument;
+    form.submit();
+}}
+</script></head>
+<body>{body}</body></html>"""
+
+FORM = """<form method="post" action="{action}" id="aspnetForm">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="">
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{viewstate}">
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{viewstate}">
+{fields}
+</form>"""
+
+TERM_FIELD = "ctl00$CapPlaceHolder$ddlExams"
+SUBMIT_FIELD = "ctl00$ContentPlaceHolder1$btnSubmit"
+
+
+def _viewstate():
+    return base64.b64encode(os.urandom(24)).decode()
+
+
+def _page(title, body):
+    return PAGE.format(title=title, body=body)
+
+
+def _form(action, fields):
+    return FORM.format(action=action, viewstate=_viewstate(), fields=fields)
+
+
+def _deferred(html, delay):
+    """Inserts `html` from a timer `delay` seconds after load, like the portal's async panels."""
+    if not delay:
+        return html
+    slot = f"deferred{random.randrange(10 ** 9)}"
+    return (f'<span id="{slot}"></span><script>setTimeout(function () {{'
+            f'document.getElementById("{slot}").outerHTML = {json.dumps(html)};'
+            f'}}, {int(delay * 1000)});</script>')
+
+
+def _rating_field(question):
+    return f"ctl00$CapPlaceHolder$gvStudentFeedback$ctl{question + 1:02d}$rblRating"
+
+
+def create_app(questions=10, terms=("1",), latency=0.0, failure_rate=0.0,
+               fail_pages=(), password=None, render_delay=0.0):
+    """
+    Builds the mock portal.
+
+    `latency` is added to every page, `failure_rate` is the chance that a page listed in
+    `fail_pages` (login, dashboard, frame, feedback) answers with HTTP 500, and `password`,
+    when set, is the only password the login form accepts. `render_delay` makes the
+    FEEDBACK link, the feedback frame and the question table appear that many seconds after
+    their page has loaded, so waits have something to wait for.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.urandom(16)
+    app.config["SUBMISSIONS"] = []
+
+    def simulate(page_name):
+        if latency:
+            time.sleep(latency)
+        if page_name in fail_pages and random.random() < failure_rate:
+            abort(500)
+
+    def require_login():
+        if "user" not in session:
+            return redirect(url_for("login"))
+        return None
+
+    @app.route("/Gokaraju/", methods=["GET", "POST"])
+    def login():
+        simulate("login")
+        message = ""
+        if request.method == "POST":
+            if "__VIEWSTATE" not in request.form:
+                abort(400)
+            username = request.form.get("txtId2", "")
+            entered = request.form.get("txtPwd2", "")
+            if username and entered and (password is None or entered == password):
+                session["user"] = username
+                return redirect(url_for("dashboard"))
+            message = '<span id="lblMessage" style="color:red">Invalid Username/Password</span>'
+        fields = f"""
+<input type="text" name="txtId2" id="txtId2">
+<input type="password" name="txtPwd2" id="txtPwd2">
+<input type="image" name="imgBtn2" id="imgBtn2" src="images/login.gif" alt="Login" width="80" height="24">
+{message}"""
+        return _page("GRIET Login", _form(url_for("login"), fields))
+
+    @app.route("/Gokaraju/StudentMaster.aspx")
+    def dashboard():
+        simulate("dashboard")
+        redirect_response = require_login()
+        if redirect_response:
+            return redirect_response
+        if request.args.get("page") == "feedback":
+            body = (f'<a href="{url_for("dashboard")}">HOME</a>' + _deferred(
+                    f'<iframe name="capIframe" id="capIframe" src="{url_for("feedback_frame")}" width="100%" height="800"></iframe>',
+                    render_delay))
+            return _page("Student Feedback", body)
+        body = (f"<h3>Welcome {session['user']}</h3>"
+                + _deferred(f'<a href="{url_for("dashboard", page="feedback")}">FEEDBACK</a>', render_delay))
+        return _page("Student Dashboard", body)
+
+    @app.route("/Gokaraju/Academics/StudentFeedback.aspx", methods=["GET", "POST"])
+    def feedback_frame():
+        simulate("frame" if request.method == "GET" else "feedback")
+        redirect_response = require_login()
+        if redirect_response:
+            return redirect_response
+        if request.method == "POST" and "__VIEWSTATE" not in request.form:
+            abort(400)
+
+        if request.form.get(SUBMIT_FIELD):
+            answers = [request.form.get(_rating_field(q)) for q in range(1, questions + 1)]
+            if None in answers:
+                return _page("Feedback", '<span id="lblMessage">Please answer all questions.</span>'), 400
+            app.config["SUBMISSIONS"].append({"user": session["user"], "term": request.form.get(TERM_FIELD), "answers": answers})
+            return _page("Feedback", '<span id="lblMessage">Feedback submitted successfully.</span>')
+
+        selected = request.form.get(TERM_FIELD, "0")
+        options = ['<option value="0">--Select--</option>'] + [
+            f'<option value="{term}"{" selected" if term == selected else ""}>Term {term}</option>' for term in terms
+        ]
+        fields = (f'<select name="{TERM_FIELD}" id="ctl00_CapPlaceHolder_ddlExams" '
+                  f"onchange=\"__doPostBack('{TERM_FIELD}','')\">{''.join(options)}</select>")
+        if selected in terms:
+            rows = ["<tr><th>#</th><th>Question</th><th>Rating</th></tr>"]
+            for q in range(1, questions + 1):
+                radios = "".join(
+                    f'<input type="radio" name="{_rating_field(q)}" id="rbl{q}_{value}" value="{value}">'
+                    f'<label for="rbl{q}_{value}">{value}</label>'
+                    for value in range(1, 6)
+                )
+                rows.append(f"<tr><td>{q}</td><td>Question {q}</td><td>{radios}</td></tr>")
+            fields += _deferred(f'<table id="ctl00_CapPlaceHolder_gvStudentFeedback">{"".join(rows)}</table>'
+                                f'<input type="submit" name="{SUBMIT_FIELD}" id="ContentPlaceHolder1_btnSubmit" value="Submit">',
+                                render_delay)
+        return _page("Feedback", _form(url_for("feedback_frame"), fields))
+
+    return app
+
+
+def start_background(app, host="127.0.0.1", port=0):
+    """Serves the mock portal on a daemon thread. Returns (server, login_url)."""
+    import threading
+
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="mock-portal", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}/Gokaraju/"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--questions", type=int, default=10, help="number of feedback questions")
+    parser.add_argument("--terms", default="1", help="comma-separated term values; empty for no active session")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every page")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="chance (0-1) that a failing page returns HTTP 500")
+    parser.add_argument("--fail-pages", default="", help="comma-separated pages to inject failures into: login,dashboard,frame,feedback")
+    parser.add_argument("--password", default=None, help="the only password accepted (default: any non-empty password)")
+    parser.add_argument("--render-delay", type=float, default=0.0, help="seconds before the FEEDBACK link, frame and questions appear")
+    args = parser.parse_args()
+
+    app = create_app(
+        questions=args.questions,
+        terms=tuple(term for term in args.terms.split(",") if term),
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        fail_pages=tuple(page for page in args.fail_pages.split(",") if page),
+        password=args.password,
+        render_delay=args.render_delay,
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
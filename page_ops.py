@@ -0,0 +1,120 @@
+import contextlib
+
+from selenium.common.exceptions import NoAlertPresentException, UnexpectedAlertPresentException
+
+# Batched page operations. Every WebDriver command is an HTTP round trip to chromedriver,
+# so work that touches many elements is done inside the page with a single execute_script.
+
+_READ_OPTIONS_JS = """
+return Array.from(arguments[0].options).map(function (opt) {
+    return {value: opt.getAttribute('value'), text: opt.text, selected: opt.selected};
+});
+"""
+
+_FILL_RATINGS_JS = """
+var rowsXpath = arguments[0], defaultRating = String(arguments[1]), overrides = arguments[2] || {};
+var rows = document.evaluate(rowsXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+var results = [];
+for (var i = 0; i < rows.snapshotLength; i++) {
+    var rating = String(overrides[String(i + 1)] !== undefined ? overrides[String(i + 1)] : defaultRating);
+    var radio = rows.snapshotItem(i).querySelector('input[type="radio"][value="' + rating + '"]');
+    if (radio) {
+        radio.click();
+    }
+    results.push({question: i + 1, answered: !!radio && radio.checked, rating: rating});
+}
+return results;
+"""
+
+
+@contextlib.contextmanager
+def count_commands(driver):
+    """Counts WebDriver commands (chromedriver round trips) sent while the block runs."""
+    counter = {"commands": 0}
+    original = driver.execute
+
+    def counting_execute(*args, **kwargs):
+        counter["commands"] += 1
+        return original(*args, **kwargs)
+
+    driver.execute = counting_execute
+    try:
+        yield counter
+    finally:
+        del driver.execute
+
+
+def read_select_options(driver, select_element):
+    """Returns every option of a <select> as {value, text, selected} dicts in one round trip."""
+    return driver.execute_script(_READ_OPTIONS_JS, select_element)
+
+
+def fill_ratings(driver, rows_xpath, default_rating, overrides=None):
+    """
+    Clicks one radio in every row matched by `rows_xpath`, all in a single round trip.
+
+    Each row gets `default_rating` unless `overrides` maps its 1-based question number to
+    another rating. Returns one {question, answered, rating} dict per row, in page order.
+    """
+    overrides = {str(question): rating for question, rating in (overrides or {}).items()}
+    return driver.execute_script(_FILL_RATINGS_JS, rows_xpath, default_rating, overrides)
+
+
+_LOGIN_STATE_JS = """
+var linkText = arguments[0], usernameId = arguments[1], errorTexts = arguments[2];
+if (window.__grietLoginPending) {
+    return {state: 'pending'};
+}
+var title = document.title || '';
+var bodyText = document.body ? document.body.innerText : '';
+if (/server error|runtime error|service unavailable|bad request|not found|^\\s*[45]\\d\\d\\b/i.test(title)
+        || /Server Error in '.*' Application/.test(bodyText)) {
+    return {state: 'portal_error', detail: title || bodyText.slice(0, 200)};
+}
+var links = document.getElementsByTagName('a');
+for (var i = 0; i < links.length; i++) {
+    if (links[i].textContent.trim() === linkText && links[i].offsetParent !== null) {
+        return {state: 'success'};
+    }
+}
+var lowerBody = bodyText.toLowerCase();
+for (var j = 0; j < errorTexts.length; j++) {
+    var at = lowerBody.indexOf(errorTexts[j].toLowerCase());
+    if (at !== -1) {
+        var line = bodyText.slice(bodyText.lastIndexOf('\\n', at) + 1).split('\\n')[0];
+        return {state: 'invalid_credentials', detail: line.trim()};
+    }
+}
+if (document.getElementById(usernameId)) {
+    return {state: 'invalid_credentials', detail: 'The portal sent us back to the login page.'};
+}
+return {state: 'pending'};
+"""
+
+
+def mark_login_submitted(driver):
+    """Tags the current document so login_state can tell it apart from the page after the postback."""
+    driver.execute_script("window.__grietLoginPending = true;")
+
+
+def login_state(driver, feedback_link_text, username_field_id, error_texts):
+    """
+    Classifies the page after a login postback in one round trip.
+
+    Returns {state, detail} where state is 'pending', 'success', 'invalid_credentials' or
+    'portal_error'. An open alert (the portal's way of rejecting some logins) counts as
+    invalid credentials and is dismissed.
+    """
+    try:
+        return driver.execute_script(_LOGIN_STATE_JS, feedback_link_text, username_field_id, list(error_texts))
+    except UnexpectedAlertPresentException as e:
+        # With chromedriver's default prompt behaviour ("dismiss and notify") the alert is
+        # already closed by now, and its text only survives on the exception.
+        detail = e.alert_text
+        try:
+            alert = driver.switch_to.alert
+            detail = detail or alert.text
+            alert.accept()
+        except NoAlertPresentException:
+            pass
+        return {"state": "invalid_credentials", "detail": detail}
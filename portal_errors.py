@@ -0,0 +1,26 @@
+# Failures reported by the portal itself. Both engines raise these, so callers can tell a
+# rejected login or a broken portal apart from a bug in the automation.
+
+
+class PortalFailure(Exception):
+    """Base class for answers from the portal that end a run early."""
+
+    outcome = "portal_failure"
+    summary = "The portal refused the request"
+
+    def log_line(self):
+        return f"\n❌ {self.summary}: {self}"
+
+
+class InvalidCredentialsError(PortalFailure):
+    """The portal rejected the GRIET username or password."""
+
+    outcome = "invalid_credentials"
+    summary = "Login failed, the portal rejected the GRIET username or password"
+
+
+class PortalErrorPage(PortalFailure):
+    """The portal answered with an HTTP error or an ASP.NET error page."""
+
+    outcome = "portal_error"
+    summary = "The portal returned an error page"
@@ -0,0 +1,172 @@
+import math
+import time
+
+import shared_store
+from automator_config import CONFIG
+
+# A circuit breaker in front of every run, shared by all gunicorn workers on the host, so an
+# unreachable portal fails runs in milliseconds instead of each one starting Chrome and
+# waiting out its page timeouts.
+#
+#   closed     runs go ahead. A cheap HEAD request to the login page, cached for PROBE_TTL
+#              seconds, must answer; a failed probe or FAILURE_THRESHOLD runs in a row that
+#              end in portal_error or timeout open the breaker.
+#   open       runs are refused at once, for OPEN_SECONDS.
+#   half_open  after that, once a probe answers, a single trial run is let through. Its
+#              outcome closes the breaker again or reopens it.
+
+shared_store.schema("""
+CREATE TABLE IF NOT EXISTS portal_breaker (
+    id INTEGER PRIMARY KEY CHECK (id = 0), state TEXT NOT NULL, failures INTEGER NOT NULL,
+    opened_at REAL NOT NULL, trial_started_at REAL, probe_at REAL NOT NULL, probe_ok INTEGER NOT NULL,
+    probe_detail TEXT, opens INTEGER NOT NULL DEFAULT 0, rejected INTEGER NOT NULL DEFAULT 0
+);
+""")
+
+# In the order of the griet_portal_breaker_state gauge values (0, 1, 2).
+STATES = ("closed", "half_open", "open")
+# Outcomes that say the portal itself is in trouble. A rejected password proves it is up.
+FAILURE_OUTCOMES = ("portal_error", "timeout")
+
+
+class PortalUnavailable(Exception):
+    """The breaker is open. `retry_after` is how many seconds remain until the next trial."""
+
+    def __init__(self, detail, retry_after):
+        super().__init__(f"The portal is not responding ({detail}). Try again in {retry_after} s.")
+        self.retry_after = retry_after
+
+
+def enabled():
+    return CONFIG["PORTAL_HEALTH"]["ENABLED"]
+
+
+def _state(conn):
+    conn.execute("INSERT OR IGNORE INTO portal_breaker (id, state, failures, opened_at, probe_at, probe_ok) "
+                 "VALUES (0, 'closed', 0, 0, 0, 1)")
+    row = conn.execute("SELECT state, failures, opened_at, trial_started_at, probe_at, probe_ok, probe_detail "
+                       "FROM portal_breaker WHERE id = 0").fetchone()
+    return dict(zip(("state", "failures", "opened_at", "trial_started_at", "probe_at", "probe_ok", "probe_detail"), row))
+
+
+def _open(conn, now, detail):
+    conn.execute("UPDATE portal_breaker SET state = 'open', opened_at = ?, trial_started_at = NULL, failures = 0, "
+                 "probe_detail = ?, opens = opens + (state != 'open') WHERE id = 0", (now, detail))
+
+
+def probe():
+    """Sends one HEAD request to the login page. Returns (ok, detail)."""
+    import requests
+
+    settings = CONFIG["PORTAL_HEALTH"]
+    started = time.monotonic()
+    try:
+        response = requests.head(CONFIG["LOGIN_URL"], timeout=settings["PROBE_TIMEOUT"], allow_redirects=True)
+        if response.status_code == 405:
+            response = requests.get(CONFIG["LOGIN_URL"], timeout=settings["PROBE_TIMEOUT"])
+    except requests.RequestException as e:
+        return False, type(e).__name__
+    if response.status_code >= 500:
+        return False, f"HTTP {response.status_code}"
+    return True, f"HTTP {response.status_code} in {time.monotonic() - started:.2f} s"
+
+
+def _probe_if_stale(now):
+    """Returns the cached probe result, probing first if it is older than PROBE_TTL. Only one worker probes at a time."""
+    with shared_store.transaction() as conn:
+        state = _state(conn)
+        if now - state["probe_at"] < CONFIG["PORTAL_HEALTH"]["PROBE_TTL"]:
+            return bool(state["probe_ok"]), state["probe_detail"]
+        # Claims the probe, so the other workers keep using the last result meanwhile.
+        conn.execute("UPDATE portal_breaker SET probe_at = ? WHERE id = 0", (now,))
+    ok, detail = probe()
+    with shared_store.transaction() as conn:
+        conn.execute("UPDATE portal_breaker SET probe_ok = ?, probe_detail = ?, probe_at = ? WHERE id = 0",
+                     (int(ok), detail, time.time()))
+    return ok, detail
+
+
+def _wait(state, now):
+    """Returns the seconds until a run may start in this state, or 0 if one may start now."""
+    settings = CONFIG["PORTAL_HEALTH"]
+    if state["state"] == "open":
+        return max(0, math.ceil(state["opened_at"] + settings["OPEN_SECONDS"] - now))
+    if state["state"] == "half_open" and state["trial_started_at"] is not None \
+            and now - state["trial_started_at"] < settings["TRIAL_TIMEOUT"]:
+        return settings["OPEN_SECONDS"]  # Unknown until the trial run ends.
+    return 0
+
+
+def _reject(conn, detail, retry_after):
+    conn.execute("UPDATE portal_breaker SET rejected = rejected + 1 WHERE id = 0")
+    return PortalUnavailable(detail or "circuit open", retry_after)
+
+
+def check():
+    """Raises PortalUnavailable if the breaker refuses runs right now. Unlike admit(), it never probes."""
+    if not enabled():
+        return
+    with shared_store.transaction() as conn:
+        state = _state(conn)
+        wait = _wait(state, time.time())
+        if wait:
+            error = _reject(conn, state["probe_detail"], wait)
+    if wait:
+        raise error
+
+
+def admit():
+    """
+    Decides whether a run may start. Returns True when it may and it is the half-open trial
+    run, False when it may as a normal run, and raises PortalUnavailable when it may not.
+    """
+    if not enabled():
+        return False
+    check()
+    now = time.time()
+    ok, detail = _probe_if_stale(now)
+    with shared_store.transaction() as conn:
+        state = _state(conn)
+        if not ok:
+            # Down, or still down after the open period: wait another one before the next trial.
+            _open(conn, now, detail)
+            error = _reject(conn, detail, CONFIG["PORTAL_HEALTH"]["OPEN_SECONDS"])
+        elif state["state"] == "closed":
+            return False
+        elif _wait(state, now):
+            error = _reject(conn, state["probe_detail"], _wait(state, now))  # Another run got the trial first.
+        else:
+            conn.execute("UPDATE portal_breaker SET state = 'half_open', trial_started_at = ? WHERE id = 0", (now,))
+            return True
+    raise error
+
+
+def record(outcome, trial):
+    """
+    Feeds a run's outcome code back to the breaker. `trial` is what admit() returned. An
+    outcome of None (the run was cancelled) gives the trial slot back without a verdict.
+    """
+    if not enabled():
+        return
+    now = time.time()
+    with shared_store.transaction() as conn:
+        state = _state(conn)
+        if outcome is None:
+            if trial:
+                conn.execute("UPDATE portal_breaker SET trial_started_at = NULL WHERE id = 0")
+        elif outcome in FAILURE_OUTCOMES:
+            if trial:
+                _open(conn, now, f"the trial run ended in {outcome}")
+            elif state["failures"] + 1 >= CONFIG["PORTAL_HEALTH"]["FAILURE_THRESHOLD"]:
+                _open(conn, now, f"{state['failures'] + 1} runs in a row ended in {outcome}")
+            else:
+                conn.execute("UPDATE portal_breaker SET failures = failures + 1 WHERE id = 0")
+        elif trial or state["state"] == "closed":
+            conn.execute("UPDATE portal_breaker SET state = 'closed', failures = 0, trial_started_at = NULL WHERE id = 0")
+
+
+def stats():
+    conn = shared_store.connect()
+    row = conn.execute("SELECT state, opens, rejected, probe_ok, probe_detail FROM portal_breaker WHERE id = 0").fetchone()
+    state, opens, rejected, probe_ok, probe_detail = row or ("closed", 0, 0, 1, None)
+    return {"state": state, "opens": opens, "rejected": rejected, "probe_ok": bool(probe_ok), "probe_detail": probe_detail}
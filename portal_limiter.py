@@ -0,0 +1,136 @@
+import contextlib
+import os
+import time
+import uuid
+
+import shared_store
+from automator_config import CONFIG
+from portal_errors import InvalidCredentialsError
+
+# Keeps the load on the GRIET portal at a rate it can serve, across every run, engine and
+# gunicorn worker on the host. Each page load or postback takes a token from one bucket in the
+# shared store; the bucket refills at a rate adjusted by AIMD: every quick, successful answer
+# raises it by a small step, and a slow or failed one halves it (at most once per
+# DECREASE_INTERVAL, so one bad burst counts once). Logins, the portal's most expensive
+# requests, are also capped at MAX_CONCURRENT_LOGINS at a time.
+
+shared_store.schema("""
+CREATE TABLE IF NOT EXISTS portal_limiter (
+    id INTEGER PRIMARY KEY CHECK (id = 0), tokens REAL NOT NULL, rate REAL NOT NULL,
+    updated_at REAL NOT NULL, decreased_at REAL NOT NULL,
+    backoffs INTEGER NOT NULL DEFAULT 0, throttled_seconds REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS portal_logins (
+    slot TEXT PRIMARY KEY, pid INTEGER NOT NULL, expires_at REAL NOT NULL
+);
+""")
+
+# How often a run waiting for a login slot checks again.
+_LOGIN_POLL_INTERVAL = 0.1
+
+
+def enabled():
+    return CONFIG["PORTAL_LIMITER"]["ENABLED"]
+
+
+def _state(conn, now):
+    settings = CONFIG["PORTAL_LIMITER"]
+    conn.execute("INSERT OR IGNORE INTO portal_limiter (id, tokens, rate, updated_at, decreased_at) VALUES (0, ?, ?, ?, 0)",
+                 (settings["BURST"], settings["START_RATE"], now))
+    return conn.execute("SELECT tokens, rate, updated_at, decreased_at FROM portal_limiter WHERE id = 0").fetchone()
+
+
+def acquire():
+    """
+    Takes a token for one request to the portal, sleeping until the bucket has one.
+    Returns the seconds spent waiting.
+    """
+    if not enabled():
+        return 0.0
+    now = time.time()
+    with shared_store.transaction() as conn:
+        tokens, rate, updated_at, _ = _state(conn, now)
+        # Tokens may go negative: that reserves a place in line, and the sleep below waits it out.
+        tokens = min(CONFIG["PORTAL_LIMITER"]["BURST"], tokens + max(now - updated_at, 0) * rate) - 1
+        wait = -tokens / rate if tokens < 0 else 0.0
+        conn.execute("UPDATE portal_limiter SET tokens = ?, updated_at = ?, throttled_seconds = throttled_seconds + ? WHERE id = 0",
+                     (tokens, now, wait))
+    if wait:
+        time.sleep(wait)
+    return wait
+
+
+def report(duration, ok):
+    """Adjusts the rate after a request that took `duration` seconds and succeeded or failed (`ok`)."""
+    if not enabled():
+        return
+    settings = CONFIG["PORTAL_LIMITER"]
+    now = time.time()
+    with shared_store.transaction() as conn:
+        _, rate, _, decreased_at = _state(conn, now)
+        if ok and duration <= settings["SLOW_RESPONSE"]:
+            conn.execute("UPDATE portal_limiter SET rate = ? WHERE id = 0", (min(settings["MAX_RATE"], rate + settings["INCREASE"]),))
+        elif now - decreased_at >= settings["DECREASE_INTERVAL"]:
+            conn.execute("UPDATE portal_limiter SET rate = ?, decreased_at = ?, backoffs = backoffs + 1 WHERE id = 0",
+                         (max(settings["MIN_RATE"], rate * settings["DECREASE_FACTOR"]), now))
+
+
+@contextlib.contextmanager
+def request():
+    """
+    Waits for a token, then times the block as one portal request. The block counts as failed
+    if it raises, unless the portal merely rejected a password, which says nothing about its load.
+    A run cancelled inside the block (GeneratorExit) is not reported at all.
+    """
+    acquire()
+    started = time.monotonic()
+    ok = False
+    try:
+        yield
+        ok = True
+    except InvalidCredentialsError:
+        ok = True
+        raise
+    except GeneratorExit:
+        ok = None
+        raise
+    finally:
+        if ok is not None:
+            report(time.monotonic() - started, ok)
+
+
+@contextlib.contextmanager
+def login_slot():
+    """Waits until fewer than MAX_CONCURRENT_LOGINS logins are in progress on the host, and holds a slot for the block."""
+    if not enabled():
+        yield
+        return
+    settings = CONFIG["PORTAL_LIMITER"]
+    slot = uuid.uuid4().hex
+    while True:
+        now = time.time()
+        with shared_store.transaction() as conn:
+            # Slots of workers that died, or of runs that never released them, expire.
+            conn.execute("DELETE FROM portal_logins WHERE expires_at < ?", (now,))
+            pids = [row[0] for row in conn.execute("SELECT pid FROM portal_logins")]
+            dead = [pid for pid in set(pids) if not shared_store.pid_alive(pid)]
+            conn.executemany("DELETE FROM portal_logins WHERE pid = ?", [(pid,) for pid in dead])
+            if len(pids) - sum(pids.count(pid) for pid in dead) < settings["MAX_CONCURRENT_LOGINS"]:
+                conn.execute("INSERT INTO portal_logins (slot, pid, expires_at) VALUES (?, ?, ?)",
+                             (slot, os.getpid(), now + settings["LOGIN_LEASE"]))
+                break
+        time.sleep(_LOGIN_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        with shared_store.transaction() as conn:
+            conn.execute("DELETE FROM portal_logins WHERE slot = ?", (slot,))
+
+
+def stats():
+    """Returns the current rate (requests per second) and the totals since the store was created."""
+    conn = shared_store.connect()
+    row = conn.execute("SELECT rate, backoffs, throttled_seconds FROM portal_limiter WHERE id = 0").fetchone()
+    rate, backoffs, throttled_seconds = row or (CONFIG["PORTAL_LIMITER"]["START_RATE"], 0, 0.0)
+    logins = conn.execute("SELECT COUNT(*) FROM portal_logins WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
+    return {"rate": rate, "backoffs": backoffs, "throttled_seconds": throttled_seconds, "logins_in_progress": logins}
@@ -0,0 +1,55 @@
+from urllib.parse import urlsplit
+
+import shared_store
+from automator_config import CONFIG
+
+# URLs discovered by walking the portal once and reused by later runs, such as the address
+# of the page inside the feedback frame. They are kept in the shared store, so every worker
+# benefits from the first discovery, and forgotten as soon as one stops working.
+
+shared_store.schema("""
+CREATE TABLE IF NOT EXISTS portal_links (
+    name TEXT PRIMARY KEY, url TEXT NOT NULL, discovered_at REAL NOT NULL
+);
+""")
+
+_cache = {}
+
+
+def _key():
+    return f"feedback_page {CONFIG['LOGIN_URL']}"
+
+
+def feedback_page_url():
+    """Returns the cached URL of the feedback page, or None when unknown or deep links are off."""
+    if not CONFIG["DEEP_LINK"]:
+        return None
+    key = _key()
+    if key not in _cache:
+        row = shared_store.connect().execute("SELECT url FROM portal_links WHERE name = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        _cache[key] = row[0]
+    return _cache[key]
+
+
+def remember_feedback_page_url(url):
+    key = _key()
+    if not CONFIG["DEEP_LINK"] or _cache.get(key) == url:
+        return
+    _cache[key] = url
+    with shared_store.transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO portal_links (name, url, discovered_at) VALUES (?, ?, julianday('now'))", (key, url))
+
+
+def forget_feedback_page_url():
+    key = _key()
+    _cache.pop(key, None)
+    with shared_store.transaction() as conn:
+        conn.execute("DELETE FROM portal_links WHERE name = ?", (key,))
+
+
+def same_page(expected_url, landed_url):
+    """Whether a navigation to `expected_url` ended there rather than being redirected (ASP.NET paths ignore case)."""
+    expected, landed = urlsplit(expected_url), urlsplit(landed_url)
+    return expected.netloc.lower() == landed.netloc.lower() and expected.path.lower() == landed.path.lower()
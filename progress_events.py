@@ -0,0 +1,143 @@
+import json
+import time
+
+from run_timings import run_timings
+
+# Typed progress events emitted by every automation engine.
+#
+# Each event is a plain dict with a "type", a wall-clock "ts" and a human-readable "message"
+# (the log line the engines used to yield). Types:
+#   stage_start      {"stage"}              a new stage of the run began
+#   stage_end        {"stage", "duration"}  the stage finished (duration in seconds)
+#   log              {...}                  informational line, optionally with extra fields
+#   question_filled  {"question", "rating"} one feedback question was answered
+#   questions_filled {"first_question", "last_question", "count", "ratings"}
+#                                           several question_filled events merged into one
+#   warning          {}                     something went wrong but the run continues
+#   outcome          {"outcome", "ok", "duration", "stages", "commands" | "http_requests"}
+#                                           always the last event of a run; "stages" maps each
+#                                           stage to its total duration in seconds
+#
+# A batch (see batch.py) streams one line per account instead of every account's events:
+#   account_start    {"account"}            a run for this account began
+#   account_done     {"account", "outcome", "ok", "duration", "detail", "done", "total",
+#                     "succeeded", "failed", "accounts_per_minute"}
+#                                           the account's run ended; the rest is batch progress
+# and ends with an outcome event carrying "accounts" (one result per account) and "accounts_per_minute".
+#
+# Clients can handle each event on its own as it arrives, instead of rescanning the log.
+
+# Outcome codes. "ok" is true for the first two.
+OUTCOMES = (
+    "success",
+    "no_session",
+    "term_unavailable",
+    "invalid_credentials",
+    "portal_error",
+    "portal_failure",
+    "portal_unavailable",
+    "timeout",
+    "error",
+    "aborted",
+)
+OK_OUTCOMES = ("success", "no_session")
+
+# Events that can be merged or dropped when a buffer overflows without losing the story of the run.
+VERBOSE_TYPES = ("question_filled",)
+
+
+def _event(event_type, message, **fields):
+    return {"type": event_type, "ts": time.time(), "message": message, **fields}
+
+
+def log(message, **fields):
+    return _event("log", message, **fields)
+
+
+def warning(message):
+    return _event("warning", message)
+
+
+def outcome(code, message, **fields):
+    return _event("outcome", message, outcome=code, ok=code in OK_OUTCOMES, **fields)
+
+
+def question_filled(question, rating):
+    return _event("question_filled", f"  - Question {question}: Answered with rating '{rating}'\n",
+                  question=question, rating=rating)
+
+
+def account_start(account):
+    return _event("account_start", f"▶ {account}: started\n", account=account)
+
+
+def account_done(account, result, **progress):
+    icon = "✅" if result["ok"] else "❌"
+    message = f"{icon} {account}: {result['outcome']} in {result['duration']:.1f} s ({progress['done']}/{progress['total']} done)\n"
+    return _event("account_done", message, account=account, **result, **progress)
+
+
+def coalesce_questions(events):
+    """Merges consecutive question_filled events into a single questions_filled event."""
+    ratings = {str(event["question"]): event["rating"] for event in events}
+    first, last = events[0]["question"], events[-1]["question"]
+    distinct = sorted({str(rating) for rating in ratings.values()})
+    rating_text = f"rating '{distinct[0]}'" if len(distinct) == 1 else f"ratings {', '.join(distinct)}"
+    merged = _event("questions_filled", f"  - Questions {first}-{last}: Answered with {rating_text}\n",
+                    first_question=first, last_question=last, count=len(events), ratings=ratings)
+    merged["ts"] = events[-1]["ts"]
+    return merged
+
+
+class RunTracker:
+    """
+    Emits stage_start/stage_end around the stages of one run and closes it with an outcome.
+
+    Stage durations are measured with a monotonic clock and summed per stage name, so a run
+    that falls back from the HTTP engine to Selenium reports the time spent in both.
+    """
+
+    def __init__(self):
+        self.stage_name = None
+        self._stage_started = None
+        self._run_started = time.monotonic()
+        self.stages = {}
+
+    def stage(self, name, message=""):
+        """Ends the current stage (if any) and starts `name`. Returns the events to yield."""
+        events = self._end_stage()
+        self.stage_name = name
+        self._stage_started = time.monotonic()
+        events.append(_event("stage_start", message, stage=name))
+        return events
+
+    def _end_stage(self):
+        if self.stage_name is None:
+            return []
+        duration = time.monotonic() - self._stage_started
+        self.stages[self.stage_name] = self.stages.get(self.stage_name, 0.0) + duration
+        event = _event("stage_end", "", stage=self.stage_name, duration=duration)
+        self.stage_name = None
+        return [event]
+
+    def outcome(self, code, message, **fields):
+        """
+        Ends the current stage and returns it together with the final outcome event, which
+        carries the run's timings. The timings are also kept in process (see run_timings.py).
+        """
+        events = self._end_stage()
+        final = outcome(code, message, duration=time.monotonic() - self._run_started,
+                        stages=dict(self.stages), **fields)
+        run_timings.record(final)
+        events.append(final)
+        return events
+
+
+def to_ndjson(event):
+    """Serializes one event as a line of NDJSON."""
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
+def render_text(event):
+    """Renders an event as the human-readable log line it stands for."""
+    return event.get("message", "")
@@ -0,0 +1,217 @@
+import fnmatch
+import itertools
+import json
+import threading
+from urllib.parse import urlsplit
+
+import websocket
+
+# URL patterns used to block each resource type. Network.setBlockedURLs only understands
+# URL wildcards, so resource types are approximated by file extension.
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*", "*.bmp*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "stylesheet": ["*.css*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*"],
+}
+
+# Rough average transfer sizes, used to estimate the bytes a blocked request would have cost.
+AVERAGE_BYTES = {
+    "Image": 25_000,
+    "Font": 40_000,
+    "Stylesheet": 15_000,
+    "Script": 35_000,
+    "Media": 250_000,
+    "Other": 5_000,
+}
+
+
+class ResourceBlocker:
+    """
+    Blocks requests the automation does not need, using CDP Network.setBlockedURLs.
+
+    Scripts from hosts outside `first_party_hosts` are learned from the performance log and
+    added to the block list as they are seen.
+
+    Network.setBlockedURLs has no exceptions, so a deny pattern that an entry of
+    `allow_patterns` could match is enforced through the Fetch domain instead (see
+    FetchInterceptor): its requests pause, the allowed URLs go ahead and the rest fail as
+    blocked. An exact URL only diverts the deny patterns that match it; an allow pattern with
+    wildcards diverts every deny pattern, as it is unknown which ones it overlaps.
+    """
+
+    def __init__(self, block_types=(), block_patterns=(), allow_patterns=(),
+                 block_third_party_scripts=True, first_party_hosts=()):
+        self.block_types = list(block_types)
+        self.block_patterns = list(block_patterns)
+        self.allow_patterns = list(allow_patterns)
+        self.block_third_party_scripts = block_third_party_scripts
+        self.first_party_hosts = {host.lower() for host in first_party_hosts}
+        self.third_party_hosts = set()
+        # Every run's thread drains into the same blocker, so the learned hosts are shared.
+        self._lock = threading.Lock()
+
+    def is_allowed(self, url):
+        """Returns whether an allow pattern lets `url` through."""
+        return any(fnmatch.fnmatch(url, allowed) for allowed in self.allow_patterns)
+
+    def _overlaps_allowed(self, pattern):
+        return any(fnmatch.fnmatch(allowed, pattern) or "*" in allowed or "?" in allowed
+                   for allowed in self.allow_patterns)
+
+    def _patterns(self):
+        """Returns every deny pattern currently in force."""
+        patterns = list(self.block_patterns)
+        for resource_type in self.block_types:
+            patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+        with self._lock:
+            hosts = sorted(self.third_party_hosts)
+        patterns.extend(f"*://{host}/*" for host in hosts)
+        return list(dict.fromkeys(patterns))
+
+    def blocked_urls(self):
+        """Returns the URL patterns Chrome blocks on its own, without any exception."""
+        return [pattern for pattern in self._patterns() if not self._overlaps_allowed(pattern)]
+
+    def intercepted_urls(self):
+        """Returns the deny patterns that an allow pattern makes exceptions to."""
+        return [pattern for pattern in self._patterns() if self._overlaps_allowed(pattern)]
+
+    def install(self, driver):
+        """Enables blocking on the driver's current tab. Called once per driver."""
+        driver.execute_cdp_cmd("Network.enable", {})
+        self._apply(driver)
+        driver.resource_blocker = self
+        self.drain(driver)
+
+    def _apply(self, driver):
+        urls = self.blocked_urls()
+        intercepted = self.intercepted_urls()
+        if intercepted and getattr(driver, "resource_interceptor", None) is None:
+            try:
+                driver.resource_interceptor = FetchInterceptor.connect(driver, self.is_allowed)
+            except Exception:
+                # Without a second DevTools connection there is no way to make exceptions:
+                # the allow patterns win, and the deny patterns they overlap are not enforced.
+                driver.resource_interceptor = False
+        if getattr(driver, "blocked_urls", None) != urls:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+            driver.blocked_urls = urls
+        interceptor = getattr(driver, "resource_interceptor", None)
+        if interceptor and interceptor.patterns != intercepted:
+            interceptor.set_patterns(intercepted)
+
+    def _is_third_party(self, url):
+        host = (urlsplit(url).hostname or "").lower()
+        return bool(host) and not any(host == fp or host.endswith("." + fp) for fp in self.first_party_hosts)
+
+    def drain(self, driver):
+        """
+        Reads the performance log accumulated since the last call and returns a report of
+        requests loaded and blocked. Newly seen third-party script hosts are blocked from now on.
+        """
+        try:
+            entries = driver.get_log("performance")
+        except Exception:
+            entries = []
+
+        request_types = {}
+        report = {"requests_loaded": 0, "bytes_loaded": 0, "requests_blocked": 0,
+                  "estimated_bytes_avoided": 0, "blocked_by_type": {}}
+        new_hosts = set()
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            method, params = message.get("method"), message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                resource_type = params.get("type", "Other")
+                request_types[params["requestId"]] = resource_type
+                url = params.get("request", {}).get("url", "")
+                if self.block_third_party_scripts and resource_type == "Script" and self._is_third_party(url):
+                    host = urlsplit(url).hostname.lower()
+                    if host not in self.third_party_hosts:
+                        new_hosts.add(host)
+            elif method == "Network.loadingFinished":
+                report["requests_loaded"] += 1
+                report["bytes_loaded"] += int(params.get("encodedDataLength", 0))
+            elif method == "Network.loadingFailed" and (params.get("blockedReason")
+                                                        or params.get("errorText") == "net::ERR_BLOCKED_BY_CLIENT"):
+                resource_type = request_types.get(params["requestId"], params.get("type", "Other"))
+                report["requests_blocked"] += 1
+                report["blocked_by_type"][resource_type] = report["blocked_by_type"].get(resource_type, 0) + 1
+                report["estimated_bytes_avoided"] += AVERAGE_BYTES.get(resource_type, AVERAGE_BYTES["Other"])
+
+        # Other drivers may have taught us new hosts since this one was last updated.
+        with self._lock:
+            self.third_party_hosts |= new_hosts
+        try:
+            self._apply(driver)
+        except Exception:
+            pass
+        return report
+
+
+class FetchInterceptor:
+    """
+    Makes per-URL exceptions to deny patterns on one tab through the Fetch domain.
+
+    Requests matching `patterns` are paused by Chrome. A thread of its own answers each one on
+    a second DevTools connection to the tab: it continues the request if `allowed(url)` is
+    true and fails it as blocked by the client otherwise. When the tab or Chrome closes, the
+    connection drops and the thread ends.
+    """
+
+    def __init__(self, ws, allowed):
+        self.patterns = []
+        self._ws = ws
+        self._allowed = allowed
+        self._ids = itertools.count(1)
+        threading.Thread(target=self._serve, name="resource-interceptor", daemon=True).start()
+
+    @classmethod
+    def connect(cls, driver, allowed):
+        """Opens the connection to the driver's current tab. Its window handle is the DevTools target ID."""
+        address = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        # No Origin header: Chrome only checks --remote-allow-origins for connections that send one.
+        ws = websocket.create_connection(f"ws://{address}/devtools/page/{driver.current_window_handle}",
+                                         suppress_origin=True)
+        return cls(ws, allowed)
+
+    def set_patterns(self, patterns):
+        self.patterns = list(patterns)
+        if self.patterns:
+            self._send("Fetch.enable", {"patterns": [{"urlPattern": pattern} for pattern in self.patterns]})
+        else:
+            self._send("Fetch.disable", {})
+
+    def _send(self, method, params):
+        # websocket-client serializes concurrent sends, so runs and the serving thread can share it.
+        self._ws.send(json.dumps({"id": next(self._ids), "method": method, "params": params}))
+
+    def _serve(self):
+        try:
+            while True:
+                message = json.loads(self._ws.recv())
+                if message.get("method") != "Fetch.requestPaused":
+                    continue
+                params = message["params"]
+                if self._allowed(params["request"]["url"]):
+                    self._send("Fetch.continueRequest", {"requestId": params["requestId"]})
+                else:
+                    self._send("Fetch.failRequest", {"requestId": params["requestId"], "errorReason": "BlockedByClient"})
+        except Exception:
+            pass  # The tab or Chrome closed; its paused requests went with it.
+        finally:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+
+
+def format_report(report):
+    """Renders a drain() report as a single log line."""
+    by_type = ", ".join(f"{count} {kind.lower()}" for kind, count in sorted(report["blocked_by_type"].items()))
+    return (
+        f"🧹 Blocked {report['requests_blocked']} requests"
+        f"{f' ({by_type})' if by_type else ''}, saving ~{report['estimated_bytes_avoided'] // 1024} KB. "
+        f"Loaded {report['requests_loaded']} requests ({report['bytes_loaded'] // 1024} KB).\n"
+    )
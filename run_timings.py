@@ -0,0 +1,57 @@
+import collections
+import threading
+
+
+class RunTimings:
+    """
+    Keeps the stage timings of the last `size` runs in this process.
+
+    Every run records the final outcome event, which carries the per-stage durations, the
+    total duration and the number of WebDriver commands (or HTTP requests) it sent.
+    """
+
+    def __init__(self, size=500):
+        self._lock = threading.Lock()
+        self._runs = collections.deque(maxlen=size)
+
+    def record(self, outcome_event):
+        with self._lock:
+            self._runs.append({
+                "outcome": outcome_event["outcome"],
+                "duration": outcome_event.get("duration", 0.0),
+                "stages": dict(outcome_event.get("stages", {})),
+                "commands": outcome_event.get("commands"),
+                "http_requests": outcome_event.get("http_requests"),
+            })
+
+    def recent(self, limit=20):
+        with self._lock:
+            return list(self._runs)[-limit:]
+
+    def stats(self):
+        """Returns p50/p95/max per stage and for the whole run (in seconds), plus command counts."""
+        with self._lock:
+            runs = list(self._runs)
+        by_stage = collections.defaultdict(list)
+        for run in runs:
+            for stage, duration in run["stages"].items():
+                by_stage[stage].append(duration)
+        commands = [run["commands"] for run in runs if run["commands"] is not None]
+        return {
+            "runs": len(runs),
+            "duration": _percentiles([run["duration"] for run in runs]),
+            "stages": {stage: _percentiles(durations) for stage, durations in by_stage.items()},
+            "commands": _percentiles(commands),
+            "outcomes": dict(collections.Counter(run["outcome"] for run in runs)),
+        }
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    return {"p50": values[len(values) // 2], "p95": values[int(len(values) * 0.95)], "max": values[-1]}
+
+
+# Shared by every engine in this process.
+run_timings = RunTimings()
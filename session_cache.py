@@ -0,0 +1,102 @@
+import hashlib
+import hmac
+import json
+import time
+
+import metrics
+import shared_store
+from automator_config import CONFIG
+
+# Portal session cookies saved after a login, so the next run for the same GRIET account can
+# skip the login form. Entries are encrypted with Fernet (SESSION_CACHE_KEY), expire after
+# SESSION_CACHE_TTL seconds and live in the shared store, keyed by an HMAC of the username.
+# Each entry is bound to the password it was created with: a run with a different password
+# (the student changed it) drops the entry instead of using it.
+#
+# Every cookie is a dict with "name", "value", "domain", "path", "secure" and "httpOnly",
+# which is what Selenium's get_cookies() returns and what the HTTP engine converts to.
+
+shared_store.schema("""
+CREATE TABLE IF NOT EXISTS session_cache (
+    account TEXT PRIMARY KEY, token BLOB NOT NULL, expires_at REAL NOT NULL
+);
+""")
+
+_fernet = None
+
+
+def enabled():
+    return bool(CONFIG["SESSION_CACHE"]["KEY"])
+
+
+def _cipher():
+    global _fernet
+    if _fernet is None:
+        from cryptography.fernet import Fernet
+
+        _fernet = Fernet(CONFIG["SESSION_CACHE"]["KEY"])
+    return _fernet
+
+
+def _digest(*parts):
+    key = CONFIG["SESSION_CACHE"]["KEY"].encode()
+    return hmac.new(key, "\0".join(parts).encode(), hashlib.sha256).hexdigest()
+
+
+def _count(result):
+    metrics.count("griet_session_cache_total", result=result)
+
+
+def load(username, password):
+    """Returns the saved {"cookies", "dashboard_url"} for an account, or None on a miss."""
+    if not enabled():
+        return None
+    from cryptography.fernet import InvalidToken
+
+    row = shared_store.connect().execute(
+        "SELECT token FROM session_cache WHERE account = ? AND expires_at > ?", (_digest(username), time.time())
+    ).fetchone()
+    if row is None:
+        _count("miss")
+        return None
+    try:
+        entry = json.loads(_cipher().decrypt(row[0], ttl=CONFIG["SESSION_CACHE"]["TTL"]))
+    except InvalidToken:
+        invalidate(username)
+        _count("miss")
+        return None
+    if not hmac.compare_digest(entry["password_check"], _digest(username, password)):
+        invalidate(username)
+        _count("password_changed")
+        return None
+    _count("hit")
+    return {"cookies": entry["cookies"], "dashboard_url": entry["dashboard_url"]}
+
+
+def store(username, password, cookies, dashboard_url):
+    """Saves the cookies of a freshly logged-in session."""
+    if not enabled():
+        return
+    entry = {"cookies": cookies, "dashboard_url": dashboard_url, "password_check": _digest(username, password)}
+    token = _cipher().encrypt(json.dumps(entry).encode())
+    now = time.time()
+    with shared_store.transaction() as conn:
+        conn.execute("DELETE FROM session_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "INSERT OR REPLACE INTO session_cache (account, token, expires_at) VALUES (?, ?, ?)",
+            (_digest(username), token, now + CONFIG["SESSION_CACHE"]["TTL"]),
+        )
+
+
+def invalidate(username):
+    """Forgets the saved session of an account, e.g. on logout or when the portal rejected it."""
+    if not enabled():
+        return
+    with shared_store.transaction() as conn:
+        conn.execute("DELETE FROM session_cache WHERE account = ?", (_digest(username),))
+
+
+def rejected(username):
+    """Records that a saved session no longer worked and forgets it."""
+    invalidate(username)
+    _count("stale")
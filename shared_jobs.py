@@ -0,0 +1,218 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import progress_events
+import shared_store
+
+# Jobs live in the memory of the gunicorn worker that runs them. This module mirrors their
+# status and events into the shared store, so any worker can report on, follow or cancel a
+# job, and keeps one in-flight claim per GRIET account, so a double-clicked Run or a second
+# tab attaches to the run already going instead of starting another browser on the same form.
+
+DONE_STATUSES = ("finished", "crashed", "cancelled")
+
+shared_store.schema("""
+CREATE TABLE IF NOT EXISTS shared_jobs (
+    job_id TEXT PRIMARY KEY, owner TEXT NOT NULL, username TEXT NOT NULL, engine TEXT NOT NULL,
+    status TEXT NOT NULL, pid INTEGER NOT NULL, created_at REAL NOT NULL, started_at REAL,
+    finished_at REAL, last_event_id INTEGER NOT NULL DEFAULT 0, result TEXT,
+    followers INTEGER NOT NULL DEFAULT 0, cancel_reason TEXT, cancel_message TEXT
+);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL, event_id INTEGER NOT NULL, event TEXT NOT NULL,
+    PRIMARY KEY (job_id, event_id)
+);
+CREATE TABLE IF NOT EXISTS inflight_accounts (
+    username TEXT PRIMARY KEY, job_id TEXT NOT NULL, pid INTEGER NOT NULL, password_check TEXT NOT NULL
+);
+""")
+
+
+class AccountBusy(Exception):
+    """A run for this GRIET account is already in progress and was started with another password."""
+
+
+def _password_check(username, password):
+    return hmac.new(shared_store.secret("shared_jobs"), f"{username}\0{password}".encode(), hashlib.sha256).hexdigest()
+
+
+class SharedJobs:
+    """
+    The shared-store side of a JobManager. Finished jobs and their events are kept for
+    `retention` seconds, and at most `log_size` events per job.
+    """
+
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, log_size=1000, retention=3600):
+        self.log_size = log_size
+        self.retention = retention
+
+    # --- Single flight ---
+
+    def claim(self, username, password, job):
+        """
+        Claims `username` for `job`. Returns the ID of a live job that already holds the claim,
+        or None if `job` got it. Raises AccountBusy if that job was started with a different password.
+        """
+        check = _password_check(username, password)
+        with shared_store.transaction() as conn:
+            row = conn.execute(
+                "SELECT i.job_id, i.pid, i.password_check, j.status FROM inflight_accounts i "
+                "LEFT JOIN shared_jobs j ON j.job_id = i.job_id WHERE i.username = ?", (username,)
+            ).fetchone()
+            if row is not None and row[3] not in DONE_STATUSES and shared_store.pid_alive(row[1]):
+                if not hmac.compare_digest(row[2], check):
+                    raise AccountBusy(f"A run for '{username}' is already in progress.")
+                return row[0]
+            conn.execute("INSERT OR REPLACE INTO inflight_accounts (username, job_id, pid, password_check) VALUES (?, ?, ?, ?)",
+                         (username, job.id, os.getpid(), check))
+            self._write_status(conn, job)
+        return None
+
+    def release(self, username, job_id):
+        with shared_store.transaction() as conn:
+            conn.execute("DELETE FROM inflight_accounts WHERE username = ? AND job_id = ?", (username, job_id))
+
+    def discard(self, username, job_id):
+        """Undoes the claim of a job that was never started."""
+        with shared_store.transaction() as conn:
+            conn.execute("DELETE FROM inflight_accounts WHERE username = ? AND job_id = ?", (username, job_id))
+            conn.execute("DELETE FROM shared_jobs WHERE job_id = ?", (job_id,))
+
+    # --- Mirroring a local job ---
+
+    def publish_status(self, job):
+        with shared_store.transaction() as conn:
+            self._write_status(conn, job)
+            if job.done:
+                cutoff = time.time() - self.retention
+                conn.execute("DELETE FROM job_events WHERE job_id IN (SELECT job_id FROM shared_jobs WHERE finished_at < ?)", (cutoff,))
+                conn.execute("DELETE FROM shared_jobs WHERE finished_at < ?", (cutoff,))
+
+    @staticmethod
+    def _write_status(conn, job):
+        conn.execute(
+            "INSERT INTO shared_jobs (job_id, owner, username, engine, status, pid, created_at, started_at, finished_at, last_event_id, result) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (job_id) DO UPDATE SET status = excluded.status, "
+            "started_at = excluded.started_at, finished_at = excluded.finished_at, last_event_id = excluded.last_event_id, "
+            "result = excluded.result",
+            (job.id, job.owner, job.username, job.engine, job.status, os.getpid(), job.created_at, job.started_at,
+             job.finished_at, job.last_event_id, json.dumps(job.result) if job.result is not None else None),
+        )
+
+    def publish_event(self, job_id, event_id, event):
+        with shared_store.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO job_events (job_id, event_id, event) VALUES (?, ?, ?)",
+                         (job_id, event_id, json.dumps(event, ensure_ascii=False)))
+            conn.execute("UPDATE shared_jobs SET last_event_id = ? WHERE job_id = ?", (event_id, job_id))
+            if event_id > self.log_size and event_id % 100 == 0:
+                conn.execute("DELETE FROM job_events WHERE job_id = ? AND event_id <= ?", (job_id, event_id - self.log_size))
+
+    def cancel_requested(self, job_id):
+        """Returns (reason, message) if a worker asked to cancel this job, else None."""
+        row = shared_store.connect().execute(
+            "SELECT cancel_reason, cancel_message FROM shared_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return tuple(row) if row and row[0] else None
+
+    def remote_followers(self, job_id):
+        row = shared_store.connect().execute("SELECT followers FROM shared_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get(self, job_id):
+        """Returns a RemoteJob for a job run by another worker, or None if it is unknown."""
+        row = shared_store.connect().execute("SELECT pid FROM shared_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return RemoteJob(self, job_id)
+
+
+class RemoteJob:
+    """A read-mostly view of a job that runs in another worker, with the same interface as Job."""
+
+    _FIELDS = ("owner", "username", "engine", "status", "pid", "created_at", "started_at", "finished_at",
+               "last_event_id", "result", "cancel_reason")
+
+    def __init__(self, shared, job_id):
+        self._shared = shared
+        self.id = job_id
+        self._refresh()
+
+    def _refresh(self):
+        row = shared_store.connect().execute(
+            f"SELECT {', '.join(self._FIELDS)} FROM shared_jobs WHERE job_id = ?", (self.id,)).fetchone()
+        for name, value in zip(self._FIELDS, row):
+            setattr(self, name, value)
+        self.result = json.loads(self.result) if self.result else None
+        if self.status not in DONE_STATUSES and not shared_store.pid_alive(self.pid):
+            # The worker running it died; nobody will ever finish it.
+            self.status = "crashed"
+            self.result = {"succeeded": False, "outcome": "error", "message": "The worker running this job exited.",
+                           "duration": None, "stages": {}}
+
+    @property
+    def done(self):
+        return self.status in DONE_STATUSES
+
+    def cancel(self, reason, message):
+        with shared_store.transaction() as conn:
+            conn.execute("UPDATE shared_jobs SET cancel_reason = ?, cancel_message = ? WHERE job_id = ? AND cancel_reason IS NULL",
+                         (reason, message, self.id))
+
+    def _events_after(self, position):
+        rows = shared_store.connect().execute(
+            "SELECT event_id, event FROM job_events WHERE job_id = ? AND event_id > ? ORDER BY event_id", (self.id, position))
+        return [(event_id, json.loads(event)) for event_id, event in rows]
+
+    def log_text(self):
+        return "".join(progress_events.render_text(event) for _, event in self._events_after(0))
+
+    def follow(self, after=0, heartbeat=None):
+        """Same contract as Job.follow, polling the shared store every POLL_INTERVAL seconds."""
+        self._add_followers(1)
+        try:
+            position = after
+            idle = 0.0
+            while True:
+                self._refresh()
+                done = self.done
+                events = self._events_after(position)
+                if events and events[0][0] > position + 1:
+                    # Event IDs have no holes, so a jump means the start of the log was pruned.
+                    missed = events[0][0] - position - 1
+                    yield events[0][0] - 1, progress_events.warning(f"[... {missed} earlier log lines are no longer available ...]\n")
+                for event in events:
+                    yield event
+                if events:
+                    position = events[-1][0]
+                    idle = 0.0
+                    continue
+                if done:
+                    return
+                time.sleep(self._shared.POLL_INTERVAL)
+                idle += self._shared.POLL_INTERVAL
+                if heartbeat and idle >= heartbeat:
+                    idle = 0.0
+                    yield None
+        finally:
+            self._add_followers(-1)
+
+    def _add_followers(self, delta):
+        with shared_store.transaction() as conn:
+            conn.execute("UPDATE shared_jobs SET followers = followers + ? WHERE job_id = ?", (delta, self.id))
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "username": self.username,
+            "engine": self.engine,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "last_event_id": self.last_event_id,
+            "result": self.result,
+        }
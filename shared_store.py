@@ -0,0 +1,78 @@
+import contextlib
+import os
+import sqlite3
+import threading
+
+from automator_config import CONFIG
+
+# A small SQLite file that every gunicorn worker on the host opens, for state that must be
+# shared across worker processes. WAL mode lets readers run while another worker writes.
+# Each module that stores something here creates its own tables through `schema`.
+
+_local = threading.local()
+_schemas = [
+    "CREATE TABLE IF NOT EXISTS store_secrets (name TEXT PRIMARY KEY, value BLOB NOT NULL);",
+]
+_schemas_lock = threading.Lock()
+_secrets = {}
+
+
+def schema(statements):
+    """Registers CREATE TABLE IF NOT EXISTS statements to run on every new connection."""
+    with _schemas_lock:
+        _schemas.append(statements)
+
+
+def connect():
+    """Returns this thread's connection to the shared store, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(CONFIG["SHARED_STORE_PATH"], timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.applied = 0
+    # Modules that register a schema after this connection was opened still get their tables.
+    with _schemas_lock:
+        pending = _schemas[_local.applied:]
+        _local.applied = len(_schemas)
+    for statements in pending:
+        conn.executescript(statements)
+    return conn
+
+
+@contextlib.contextmanager
+def transaction():
+    """
+    Runs a block as one write transaction. BEGIN IMMEDIATE takes the write lock up front, so
+    a read-then-write inside the block cannot race another worker doing the same.
+    """
+    conn = connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def secret(name):
+    """Returns a random 32-byte key shared by every worker on this host, created on first use."""
+    if name not in _secrets:
+        conn = connect()
+        conn.execute("INSERT OR IGNORE INTO store_secrets (name, value) VALUES (?, ?)", (name, os.urandom(32)))
+        _secrets[name] = conn.execute("SELECT value FROM store_secrets WHERE name = ?", (name,)).fetchone()[0]
+    return _secrets[name]
+
+
+def pid_alive(pid):
+    """Returns whether a process with this pid still exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the top of the repository, next to app.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keeps the tests off the host's real shared store (see shared_store.py).
+os.environ.setdefault("SHARED_STORE_PATH", os.path.join(tempfile.mkdtemp(prefix="griet-tests-"), "shared.db"))
@@ -0,0 +1,80 @@
+import os
+import threading
+
+import pytest
+
+import feedback_automator
+
+RUNS = 6
+
+
+class _FakeChrome:
+    """Stands in for webdriver.Chrome: records its arguments and writes into its profile like Chrome does."""
+
+    all_up = None
+
+    def __init__(self, options, service):
+        self.arguments = list(options.arguments)
+        profile_dir = self.argument("--user-data-dir")
+        assert os.path.isdir(profile_dir)
+        with open(os.path.join(profile_dir, "DevToolsActivePort"), "w") as f:
+            f.write("0\n")
+        self.quit_called = False
+        if self.all_up is not None:
+            self.all_up.wait()  # Every session is alive at once, as with concurrent runs.
+
+    def argument(self, name):
+        return next(argument.split("=", 1)[1] for argument in self.arguments if argument.startswith(name + "="))
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture
+def fake_chrome(monkeypatch, tmp_path):
+    monkeypatch.setenv("CHROME_PROFILE_ROOT", str(tmp_path))
+    monkeypatch.setattr(feedback_automator.webdriver, "Chrome", _FakeChrome)
+    monkeypatch.setattr(feedback_automator, "chrome_service", lambda: None)
+    monkeypatch.setattr(_FakeChrome, "all_up", threading.Barrier(RUNS, timeout=10))
+    return tmp_path
+
+
+def test_concurrent_sessions_get_their_own_profile_and_port(fake_chrome):
+    drivers = []
+    errors = []
+
+    def launch():
+        try:
+            drivers.append(feedback_automator.create_driver())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=launch) for _ in range(RUNS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    profile_dirs = [driver.argument("--user-data-dir") for driver in drivers]
+    assert len(set(profile_dirs)) == RUNS
+    assert all(driver.profile_dir == driver.argument("--user-data-dir") for driver in drivers)
+    assert all(os.path.dirname(profile_dir) == str(fake_chrome) for profile_dir in profile_dirs)
+    # Port 0: every Chrome picks a free debugging port of its own.
+    assert all(driver.argument("--remote-debugging-port") == "0" for driver in drivers)
+
+    for driver in drivers:
+        feedback_automator.close_driver(driver)
+    assert all(driver.quit_called for driver in drivers)
+    assert not any(os.path.exists(profile_dir) for profile_dir in profile_dirs)
+    assert not set(profile_dirs) & feedback_automator._live_profile_dirs
+
+
+def test_profile_of_a_failed_launch_is_removed(fake_chrome, monkeypatch):
+    def broken_chrome(options, service):
+        raise RuntimeError("chrome not reachable")
+
+    monkeypatch.setattr(feedback_automator.webdriver, "Chrome", broken_chrome)
+    with pytest.raises(RuntimeError):
+        feedback_automator.create_driver()
+    assert os.listdir(fake_chrome) == []
@@ -0,0 +1,55 @@
+import progress_events
+from jobs import Job
+
+
+def _questions(events):
+    """The question numbers a client was shown, merged lines expanded."""
+    numbers = []
+    for event in events:
+        if event["type"] == "question_filled":
+            numbers.append(event["question"])
+        elif event["type"] == "questions_filled":
+            numbers.extend(range(event["first_question"], event["last_question"] + 1))
+    return numbers
+
+
+def _follow_until(job, after, count):
+    stream = job.follow(after)
+    seen = [next(stream) for _ in range(count)]
+    stream.close()
+    return seen
+
+
+def test_resuming_inside_a_coalesced_run_does_not_replay_questions():
+    job = Job("owner", "account", "selenium", log_size=6)
+    job.append(progress_events.log("start\n"))
+    for question in (1, 2):
+        job.append(progress_events.question_filled(question, "5"))
+    # The client got the first question, then lost its connection.
+    seen = _follow_until(job, 0, 2)
+    position = seen[-1][0]
+
+    for question in range(3, 9):
+        job.append(progress_events.question_filled(question, "5"))  # Overflows: questions get merged.
+    job.append(progress_events.outcome("success", "done"))
+    job.finish("finished")
+    assert job.coalesced
+
+    resumed = list(job.follow(position))
+    ids = [event_id for event_id, _ in resumed]
+    assert ids == sorted(ids) and all(event_id > position for event_id in ids)
+    shown = _questions([event for _, event in seen + resumed])
+    assert len(shown) == len(set(shown)), shown
+    assert resumed[-1][1]["type"] == "outcome"
+
+
+def test_follower_from_the_start_gets_every_question_once():
+    job = Job("owner", "account", "selenium", log_size=4)
+    for question in range(1, 11):
+        job.append(progress_events.question_filled(question, "4"))
+    job.append(progress_events.outcome("success", "done"))
+    job.finish("finished")
+
+    events = [event for _, event in job.follow(0)]
+    assert _questions(events) == sorted(set(_questions(events)))
+    assert events[-1]["type"] == "outcome"
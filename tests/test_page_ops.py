@@ -0,0 +1,46 @@
+from selenium.common.exceptions import NoAlertPresentException, UnexpectedAlertPresentException
+
+from page_ops import login_state
+
+
+class _SwitchTo:
+    def __init__(self, alert):
+        self._alert = alert
+
+    @property
+    def alert(self):
+        if self._alert is None:
+            raise NoAlertPresentException()
+        return self._alert
+
+
+class _Alert:
+    text = "Invalid Username/Password"
+    accepted = False
+
+    def accept(self):
+        self.accepted = True
+
+
+class _AlertDriver:
+    """A driver whose page script fails on an alert, as chromedriver reports it."""
+
+    def __init__(self, alert_text, open_alert=None):
+        self._alert_text = alert_text
+        self.switch_to = _SwitchTo(open_alert)
+
+    def execute_script(self, script, *args):
+        raise UnexpectedAlertPresentException(alert_text=self._alert_text)
+
+
+def test_alert_already_dismissed_by_chromedriver_counts_as_invalid_credentials():
+    # chromedriver's default prompt behaviour closes the alert before the exception arrives.
+    state = login_state(_AlertDriver("Invalid Username/Password"), "FEEDBACK", "txtId2", ["Invalid"])
+    assert state == {"state": "invalid_credentials", "detail": "Invalid Username/Password"}
+
+
+def test_alert_still_open_is_accepted():
+    alert = _Alert()
+    state = login_state(_AlertDriver(None, open_alert=alert), "FEEDBACK", "txtId2", ["Invalid"])
+    assert state == {"state": "invalid_credentials", "detail": "Invalid Username/Password"}
+    assert alert.accepted
@@ -0,0 +1,75 @@
+import json
+import queue
+import threading
+
+from resource_blocking import FetchInterceptor, ResourceBlocker
+
+
+class _FakeSocket:
+    """Plays the DevTools side of a FetchInterceptor's connection."""
+
+    def __init__(self):
+        self.incoming = queue.Queue()
+        self.sent = queue.Queue()
+
+    def recv(self):
+        message = self.incoming.get(timeout=5)
+        if message is None:
+            raise ConnectionError("closed")
+        return message
+
+    def send(self, text):
+        self.sent.put(json.loads(text))
+
+    def close(self):
+        pass
+
+
+def _paused(request_id, url):
+    return json.dumps({"method": "Fetch.requestPaused", "params": {"requestId": request_id, "request": {"url": url}}})
+
+
+def test_an_allowed_url_only_diverts_the_deny_patterns_it_matches():
+    blocker = ResourceBlocker(block_types=["stylesheet", "font"], block_patterns=["*doubleclick.net/*"],
+                              allow_patterns=["https://cdn.example.com/app.css"])
+    assert "*.css*" not in blocker.blocked_urls()
+    assert blocker.intercepted_urls() == ["*.css*"]
+    assert "*.woff*" in blocker.blocked_urls() and "*doubleclick.net/*" in blocker.blocked_urls()
+    assert blocker.is_allowed("https://cdn.example.com/app.css")
+    assert not blocker.is_allowed("https://other.example.com/site.css")
+
+
+def test_interceptor_continues_allowed_requests_and_fails_the_rest():
+    ws = _FakeSocket()
+    interceptor = FetchInterceptor(ws, ResourceBlocker(allow_patterns=["https://cdn.example.com/app.css"]).is_allowed)
+    interceptor.set_patterns(["*.css*"])
+    assert ws.sent.get(timeout=5) == {"id": 1, "method": "Fetch.enable", "params": {"patterns": [{"urlPattern": "*.css*"}]}}
+
+    ws.incoming.put(_paused("1", "https://cdn.example.com/app.css"))
+    ws.incoming.put(_paused("2", "https://other.example.com/site.css"))
+    assert ws.sent.get(timeout=5)["method"] == "Fetch.continueRequest"
+    failed = ws.sent.get(timeout=5)
+    assert failed["method"] == "Fetch.failRequest"
+    assert failed["params"] == {"requestId": "2", "errorReason": "BlockedByClient"}
+    ws.incoming.put(None)
+
+
+def test_hosts_learned_by_other_runs_do_not_break_blocked_urls():
+    blocker = ResourceBlocker(block_third_party_scripts=True, first_party_hosts=["portal.example"])
+
+    def learn(start):
+        for number in range(start, start + 500):
+            entry = {"message": json.dumps({"message": {"method": "Network.requestWillBeSent", "params": {
+                "requestId": str(number), "type": "Script", "request": {"url": f"https://h{number}.example.net/x.js"}}}})}
+            driver = type("Driver", (), {"get_log": lambda self, kind, entry=entry: [entry],
+                                         "execute_cdp_cmd": lambda self, *args: None})()
+            blocker.drain(driver)
+
+    threads = [threading.Thread(target=learn, args=(start,)) for start in (0, 500)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        blocker.blocked_urls()
+    for thread in threads:
+        thread.join()
+    assert len(blocker.third_party_hosts) == 1000